@@ -2,7 +2,24 @@ from pygame import Rect
 from pygine.maths import Vector2
 
 
+if hasattr(Rect, "update"):
+    def set_rectangle(rectangle, x, y, width, height):
+        "Moves and resizes a Rect in place. The values are truncated exactly like the Rect constructor truncates them."
+        rectangle.update(x, y, width, height)
+else:
+    # Rect.update() only exists since pygame 2.0.1. The values are truncated by hand, since some versions of pygame round
+    # floats that are assigned to a single attribute instead.
+    def set_rectangle(rectangle, x, y, width, height):
+        "Moves and resizes a Rect in place. The values are truncated exactly like the Rect constructor truncates them."
+        rectangle.x = int(x)
+        rectangle.y = int(y)
+        rectangle.width = int(width)
+        rectangle.height = int(height)
+
+
 class PygineObject(object):
+    __slots__ = ("x", "y", "width", "height", "location", "bounds")
+
     def __init__(self, x, y, width, height):
         self.x = x
         self.y = y
@@ -13,14 +30,15 @@ class PygineObject(object):
 
     def set_width(self, width):
         self.width = width
-        self.bounds = Rect(self.x, self.y, self.width, self.height)
+        set_rectangle(self.bounds, self.x, self.y, self.width, self.height)
 
     def set_height(self, height):
         self.height = height
-        self.bounds = Rect(self.x, self.y, self.width, self.height)
+        set_rectangle(self.bounds, self.x, self.y, self.width, self.height)
 
     def set_location(self, x, y):
         self.x = x
         self.y = y
-        self.location = Vector2(self.x, self.y)
-        self.bounds = Rect(self.x, self.y, self.width, self.height)
+        self.location.x = self.x
+        self.location.y = self.y
+        set_rectangle(self.bounds, self.x, self.y, self.width, self.height)
@@ -0,0 +1,356 @@
+import timeit
+import tracemalloc
+from random import Random
+from pygame import Rect
+from pygine.entities import Block, Entity, Kinetic
+from pygine.levels import read_compiled_level, TileType
+from pygine.manifest import ASSET_PATH, load_manifest
+from pygine.profiler import FrameProfiler, percentile, PERCENTILES
+from pygine.structures import KineticGrid, Quadtree, SpatialHash, SweepAndPrune
+
+REPEAT = 5
+REBUILDS = 200
+QUERY_STEP = 4
+
+STRESS_CRABS = (10, 50, 200, 500)
+STRESS_FRAMES = 60
+BROADPHASE_MARGIN = 16
+
+
+def __load_level(level):
+    "Returns the scene bounds and the static entities of a shipped level, the way Level spawns them."
+    bounds = Rect(0, 0, level["image"]["width"], level["image"]["height"])
+    entities = []
+    for tile, x, y, width, height in read_compiled_level(ASSET_PATH + level["compiled"]["path"]):
+        if tile not in (TileType.PLAYER, TileType.CRAB):
+            entities.append(Block(x, y, width, height))
+    return bounds, entities
+
+
+def __query_areas(bounds):
+    "Returns the area a Player queries around itself at every QUERY_STEP pixels of the level."
+    result = []
+    for y in range(0, bounds.height, QUERY_STEP * 4):
+        for x in range(0, bounds.width, QUERY_STEP):
+            result.append(Rect(x - 16, y - 32, 12 + 16 * 2, 28 + 32 * 2))
+    return result
+
+
+def __create_indices(bounds):
+    return [
+        ("Quadtree", Quadtree(bounds, 4)),
+        ("SpatialHash(4)", SpatialHash(bounds, 4)),
+        ("SpatialHash(5)", SpatialHash(bounds, 5))
+    ]
+
+
+def __rebuild(index, entities):
+    index.clear()
+    for e in entities:
+        index.insert(e)
+
+
+def __query(index, areas, result):
+    for area in areas:
+        index.query(area, result)
+
+
+def __check(indices, areas):
+    "Makes sure every index finds exactly the same entities as the quadtree."
+    expected = indices[0][1]
+    for name, index in indices[1:]:
+        for area in areas:
+            assert (sorted(map(id, index.query(area))) == sorted(map(id, expected.query(area)))), \
+                name + " does not agree with the Quadtree!"
+
+
+def run_indices():
+    manifest = load_manifest()
+    totals = {}
+
+    for category in ("levels", "bosses"):
+        for level in manifest[category]:
+            bounds, entities = __load_level(level)
+            areas = __query_areas(bounds)
+            indices = __create_indices(bounds)
+
+            for name, index in indices:
+                __rebuild(index, entities)
+            __check(indices, areas)
+
+            for name, index in indices:
+                result = []
+                rebuild = min(timeit.repeat(
+                    lambda: __rebuild(index, entities), number=REBUILDS, repeat=REPEAT)) / REBUILDS
+                query = min(timeit.repeat(
+                    lambda: __query(index, areas, result), number=1, repeat=REPEAT)) / len(areas)
+
+                total = totals.setdefault(name, [0, 0])
+                total[0] += rebuild
+                total[1] += query
+
+                print("{}/{:<3} {:<20} {:>4} entities  rebuild {:8.1f} us  query {:6.2f} us".format(
+                    category, level["id"], name, len(entities), rebuild * 1e6, query * 1e6))
+
+    print()
+    for name, (rebuild, query) in totals.items():
+        print("{:<20} total rebuild {:8.1f} us  total query {:6.2f} us".format(
+            name, rebuild * 1e6, query * 1e6))
+
+
+def __create_crabs(total, bounds, random):
+    crabs = []
+    for i in range(total):
+        crabs.append(Entity(
+            random.randint(0, bounds.width - 11),
+            random.randint(0, bounds.height - 9),
+            11,
+            9
+        ))
+    return crabs
+
+
+def __query_grid(grid, crabs, result):
+    "Finds nearby kinetic entities the way entities do without a broadphase, by each querying the grid with its own area."
+    for crab in crabs:
+        grid.query(crab.bounds.inflate(BROADPHASE_MARGIN * 2, BROADPHASE_MARGIN * 2), result)
+
+
+def __find_pairs_with_grid(grid, crabs, result):
+    pairs = set()
+    for crab in crabs:
+        area = crab.bounds.inflate(BROADPHASE_MARGIN * 2, BROADPHASE_MARGIN * 2)
+        for other in grid.query(area, result):
+            if other is not crab:
+                pairs.add((min(id(crab), id(other)), max(id(crab), id(other))))
+    return pairs
+
+
+def run_broadphase():
+    "Walks a crowd of crab sized entities around for a few frames, and times how long each frame takes to find every nearby pair."
+    for total in STRESS_CRABS:
+        random = Random(total)
+        # Keep the crowd about as dense as a busy level, no matter how many crabs there are.
+        bounds = Rect(0, 0, max(total * 16, 640), 240)
+        crabs = __create_crabs(total, bounds, random)
+
+        grid = KineticGrid(bounds, 5)
+        broadphase = SweepAndPrune(BROADPHASE_MARGIN)
+        for crab in crabs:
+            grid.insert(crab)
+            broadphase.insert(crab)
+
+        grid_time = 0
+        broadphase_time = 0
+        result = []
+        for frame in range(STRESS_FRAMES):
+            for crab in crabs:
+                crab.set_location(
+                    min(max(crab.x + random.randint(-2, 2), 0), bounds.width - 11),
+                    min(max(crab.y + random.randint(-2, 2), 0), bounds.height - 9)
+                )
+
+            grid_time += min(timeit.repeat(
+                lambda: __query_grid(grid, crabs, result), number=1, repeat=REPEAT))
+            broadphase_time += min(timeit.repeat(
+                lambda: broadphase.update(), number=1, repeat=REPEAT))
+
+            # Everything an entity would have found on its own must also be in the broadphase's pairs.
+            expected = __find_pairs_with_grid(grid, crabs, result)
+            found = set((min(id(a), id(b)), max(id(a), id(b))) for a, b in broadphase.pairs)
+            assert (expected <= found), "SweepAndPrune missed a pair!"
+
+        print("{:>4} crabs  grid queries {:8.1f} us/frame  sweep and prune {:8.1f} us/frame  ({} pairs)".format(
+            total,
+            grid_time / STRESS_FRAMES * 1e6,
+            broadphase_time / STRESS_FRAMES * 1e6,
+            len(broadphase.pairs)
+        ))
+
+
+class _BaselineVector2:
+    "Stands in for Vector2 before it had __slots__."
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = x
+        self.y = y
+
+
+class _BaselineObject:
+    "Stands in for PygineObject before it had __slots__, back when every move allocated a new Vector2 and a new Rect."
+
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.location = _BaselineVector2(self.x, self.y)
+        self.bounds = Rect(self.x, self.y, self.width, self.height)
+
+    def set_location(self, x, y):
+        self.x = x
+        self.y = y
+        self.location = _BaselineVector2(self.x, self.y)
+        self.bounds = Rect(self.x, self.y, self.width, self.height)
+
+
+class _BaselineOutline(_BaselineObject):
+    "Stands in for the Rectangle every Entity outlines its bounds with, which used to build all four sides again on every move."
+    THICKNESS = 2
+
+    def __init__(self, x, y, width, height):
+        super(_BaselineOutline, self).__init__(x, y, width, height)
+        self.place_sides()
+
+    def set_location(self, x, y):
+        super(_BaselineOutline, self).set_location(x, y)
+        self.place_sides()
+
+    def place_sides(self):
+        thickness = _BaselineOutline.THICKNESS
+        self.rectangles = [
+            Rect(self.x, self.y, self.width, thickness),
+            Rect(self.x + self.width - thickness, self.y + thickness, thickness, self.height - thickness * 2),
+            Rect(self.x, self.y + self.height - thickness, self.width, thickness),
+            Rect(self.x, self.y + thickness, thickness, self.height - thickness * 2)
+        ]
+
+
+class _BaselineEntity(_BaselineObject):
+    "Stands in for Entity before it had __slots__."
+
+    def __init__(self, x, y, width, height):
+        super(_BaselineEntity, self).__init__(x, y, width, height)
+        self.color = (255, 255, 255)
+        self.layer = 0
+        self.remove = False
+        self.spatial_index = None
+        self.collision_layer = 0
+        self.outline = _BaselineOutline(self.x, self.y, self.width, self.height)
+
+    def set_location(self, x, y):
+        super(_BaselineEntity, self).set_location(x, y)
+        self.outline.set_location(self.x, self.y)
+
+
+class _BaselineKinetic(_BaselineEntity):
+    "Stands in for Kinetic before it had __slots__, back when its collision rectangles were built again every frame."
+
+    def __init__(self, x, y, width, height, speed):
+        super(_BaselineKinetic, self).__init__(x, y, width, height)
+        self.velocity = _BaselineVector2()
+        self.gravity = 0
+        self.default_move_speed = speed
+        self.move_speed = 0
+        self.facing = 0
+        self.collision_rectangles = []
+        self.collision_width = 0
+        self.kinetic_query_result = []
+
+    def _update_collision_rectangles(self):
+        self.collision_width = 4
+        self.collision_rectangles = [
+            Rect(self.x + 2, self.y - self.collision_width,
+                 self.width - 4, self.collision_width),
+            Rect(self.x + 2, self.y + self.height,
+                 self.width - 4, self.collision_width),
+            Rect(self.x - self.collision_width, self.y + self.collision_width * 2,
+                 self.collision_width, self.height - self.collision_width * 2 * 2),
+            Rect(self.x + self.width, self.y + self.collision_width * 2,
+                 self.collision_width, self.height - self.collision_width * 2 * 2)
+        ]
+
+
+def __create_moving_entities(entity_type, total):
+    result = []
+    for i in range(total):
+        if entity_type in (Kinetic, _BaselineKinetic):
+            result.append(entity_type(i * 16, 0, 11, 9, 25))
+        else:
+            result.append(entity_type(i * 16, 0, 11, 9))
+    return result
+
+
+def __move(entities, frame):
+    for entity in entities:
+        entity.set_location(entity.x + 1, frame * 0.5)
+        if hasattr(entity, "_update_collision_rectangles"):
+            entity._update_collision_rectangles()
+
+
+def __measure_memory(entity_type, total):
+    "Returns how many bytes every entity takes up, and how many bytes and blocks moving all of them allocates per entity per frame."
+    tracemalloc.start()
+    entities = __create_moving_entities(entity_type, total)
+    entity_bytes = tracemalloc.get_traced_memory()[0] / total
+
+    # Clearing the traces also resets the peak, so the peak only covers what a single frame allocates. A snapshot taken
+    # right after the frame counts the blocks it allocated that are still alive, like a replaced Vector2 or Rect.
+    __move(entities, 0)
+    churn = 0
+    blocks = 0
+    for frame in range(1, STRESS_FRAMES + 1):
+        tracemalloc.clear_traces()
+        __move(entities, frame)
+        churn += tracemalloc.get_traced_memory()[1]
+        blocks += sum(statistic.count for statistic in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+
+    return entity_bytes, churn / STRESS_FRAMES / total, blocks / STRESS_FRAMES / total
+
+
+def run_memory():
+    "Measures how many bytes every entity takes up and how much moving all of them allocates in a frame, before and after __slots__ and moving in place."
+    total = STRESS_CRABS[-1]
+    for name, before_type, after_type in (("Entity", _BaselineEntity, Entity), ("Kinetic", _BaselineKinetic, Kinetic)):
+        for label, entity_type in (("before", before_type), ("after", after_type)):
+            entity_bytes, churn, blocks = __measure_memory(entity_type, total)
+            print("{:>4} {:<8} {:<6} {:8.1f} bytes/entity  {:8.1f} bytes and {:5.2f} allocations/entity/frame".format(
+                total, name, label, entity_bytes, churn, blocks))
+
+
+def __check_percentiles():
+    "Checks percentile() against the nearest ranks of 1...n, where the p-th percentile is the ceil(p / 100 * n)-th value."
+    expected_ranks = {
+        1: (1, 1, 1),
+        10: (5, 10, 10),
+        100: (50, 95, 99),
+        300: (150, 285, 297)
+    }
+    for total, ranks in expected_ranks.items():
+        values = list(range(1, total + 1))
+        for p, expected in zip(PERCENTILES, ranks):
+            assert (percentile(values, p) == expected), \
+                "percentile() returned the wrong value for p{} of {} frames!".format(p, total)
+    assert (percentile([], 50) == 0), "percentile() of no frames is not 0!"
+
+
+def __profile_phases(profiler, phases):
+    profiler.begin_frame()
+    for phase in phases:
+        profiler.begin(phase)
+        profiler.end(phase)
+    profiler.end_frame()
+
+
+def run_profiler():
+    "Checks the percentiles the profiler reports, and times what profiling a frame costs with the profiler on and off."
+    __check_percentiles()
+
+    phases = ["phase {}".format(i) for i in range(12)]
+    for enabled in (False, True):
+        profiler = FrameProfiler()
+        profiler.enabled = enabled
+        time = min(timeit.repeat(
+            lambda: __profile_phases(profiler, phases), number=STRESS_FRAMES, repeat=REPEAT)) / STRESS_FRAMES
+        print("profiler {:<3}  {:>2} phases  {:8.1f} us/frame".format("on" if enabled else "off", len(phases), time * 1e6))
+
+
+if __name__ == "__main__":
+    run_indices()
+    print()
+    run_broadphase()
+    print()
+    run_memory()
+    print()
+    run_profiler()
@@ -1,8 +1,17 @@
 import pygame
+from collections import Counter, OrderedDict
 from pygine.maths import Vector2
 from pygine.utilities import Camera, Color, CameraType, StaticCamera
 
 
+SCALED_IMAGE_CACHE_CAPACITY = 512
+
+__scaled_image_cache = OrderedDict()
+__scaled_image_cache_scale = 0
+
+__display_list = None
+
+
 def __scaled_location(x, y, camera_type):
     if camera_type == CameraType.DYNAMIC:
         return Vector2(x * Camera.scale - Camera.top_left.x, y * Camera.scale - Camera.top_left.y)
@@ -14,61 +23,146 @@ def __scaled_value(value):
     return value * Camera.scale
 
 
+def begin_display_list():
+    "Record every draw call instead of drawing it, until end_display_list() is called."
+    global __display_list
+    __display_list = []
+
+
+def end_display_list():
+    "Stop recording draw calls, and return everything that was recorded since begin_display_list()."
+    global __display_list
+    display_list = __display_list
+    __display_list = None
+    return display_list
+
+
+def replay_display_list(surface, display_list, area):
+    "Draw every recorded draw call that touches area onto surface."
+    for draw_function, arguments, bounds in display_list:
+        if bounds.colliderect(area):
+            draw_function(surface, *arguments)
+
+
+def calculate_dirty_rectangles(previous_display_list, display_list):
+    "Returns the regions covered by draw calls that are not shared by both display lists."
+    previous_draw_calls = Counter(
+        (draw_function, arguments) for draw_function, arguments, bounds in previous_display_list)
+    draw_calls = Counter(
+        (draw_function, arguments) for draw_function, arguments, bounds in display_list)
+
+    result = []
+    for draw_function, arguments, bounds in previous_display_list:
+        if previous_draw_calls[(draw_function, arguments)] > draw_calls[(draw_function, arguments)]:
+            result.append(bounds)
+    for draw_function, arguments, bounds in display_list:
+        if draw_calls[(draw_function, arguments)] > previous_draw_calls[(draw_function, arguments)]:
+            result.append(bounds)
+
+    return result
+
+
+def __draw(surface, draw_function, arguments, bounds):
+    if __display_list is None:
+        draw_function(surface, *arguments)
+    else:
+        __display_list.append((draw_function, arguments, bounds))
+
+
+def __blit(surface, image, location):
+    surface.blit(image, location)
+
+
 def draw_rectangle(surface, rect, camera_type, color=Color.WHITE, thickness=0):
-    pygame.draw.rect(
+    location = __scaled_location(rect.x, rect.y, camera_type)
+    scaled_rect = (
+        location.x,
+        location.y,
+        __scaled_value(rect.width),
+        __scaled_value(rect.height)
+    )
+    __draw(
         surface,
-        color,
-        (
-            __scaled_location(rect.x, rect.y, camera_type).x,
-            __scaled_location(rect.x, rect.y, camera_type).y,
-            __scaled_value(rect.width),
-            __scaled_value(rect.height)
-        ),
-        thickness
+        pygame.draw.rect,
+        (color, scaled_rect, thickness),
+        pygame.Rect(scaled_rect).inflate(thickness * 2 + 2, thickness * 2 + 2)
     )
 
 
 def draw_line(surface, x1, y1, x2, y2, camera_type, color=Color.WHITE, thickness=1):
-    pygame.draw.line(
+    start = __scaled_location(x1, y1, camera_type)
+    end = __scaled_location(x2, y2, camera_type)
+    scaled_thickness = int(__scaled_value(thickness))
+    __draw(
         surface,
-        color,
-        [
-            __scaled_location(x1, y1, camera_type).x,
-            __scaled_location(x1, y1, camera_type).y
-        ],
-        [
-            __scaled_location(x2, y2, camera_type).x,
-            __scaled_location(x2, y2, camera_type).y
-        ],
-        int(__scaled_value(thickness))
+        pygame.draw.line,
+        (color, (start.x, start.y), (end.x, end.y), scaled_thickness),
+        pygame.Rect(
+            min(start.x, end.x),
+            min(start.y, end.y),
+            abs(end.x - start.x),
+            abs(end.y - start.y)
+        ).inflate(scaled_thickness * 2 + 2, scaled_thickness * 2 + 2)
     )
 
 
 def draw_circle(surface, center, radius, camera_type, color=Color.WHITE, thickness=0):
-    pygame.draw.circle(
+    location = __scaled_location(center.x, center.y, camera_type)
+    scaled_center = (int(location.x), int(location.y))
+    scaled_radius = int(__scaled_value(radius))
+    __draw(
         surface,
-        color,
-        (
-            int(__scaled_location(center.x, center.y, camera_type).x),
-            int(__scaled_location(center.x, center.y, camera_type).y),
-        ),
-        int(__scaled_value(radius)),
-        int(__scaled_value(thickness))
+        pygame.draw.circle,
+        (color, scaled_center, scaled_radius, int(__scaled_value(thickness))),
+        pygame.Rect(
+            scaled_center[0] - scaled_radius - 1,
+            scaled_center[1] - scaled_radius - 1,
+            scaled_radius * 2 + 2,
+            scaled_radius * 2 + 2
+        )
     )
 
 
+def clear_scaled_image_cache():
+    "Forget every scaled image. Call this whenever the camera scale changes."
+    global __scaled_image_cache_scale
+    __scaled_image_cache.clear()
+    __scaled_image_cache_scale = StaticCamera.scale
+
+
+def __scaled_image(image, width, height):
+    if __scaled_image_cache_scale != StaticCamera.scale:
+        clear_scaled_image_cache()
+
+    if image.get_width() == width and image.get_height() == height:
+        return image
+
+    key = (id(image), width, height)
+    entry = __scaled_image_cache.get(key)
+    # The source surface is kept alongside the result so its id cannot be reused while cached.
+    if entry is not None and entry[0] is image:
+        __scaled_image_cache.move_to_end(key)
+        return entry[1]
+
+    scaled_image = pygame.transform.scale(image, (width, height))
+    __scaled_image_cache[key] = (image, scaled_image)
+    if len(__scaled_image_cache) > SCALED_IMAGE_CACHE_CAPACITY:
+        __scaled_image_cache.popitem(last=False)
+
+    return scaled_image
+
+
 def draw_image(surface, image, rect, camera_type):
-    image = pygame.transform.scale(
+    image = __scaled_image(
         image,
-        (
-            int(__scaled_value(rect.width)),
-            int(__scaled_value(rect.height))
-        )
+        int(__scaled_value(rect.width)),
+        int(__scaled_value(rect.height))
     )
-    surface.blit(
-        image,
-        (
-            __scaled_location(rect.x, rect.y, camera_type).x,
-            __scaled_location(rect.x, rect.y, camera_type).y
-        )
+    location = __scaled_location(rect.x, rect.y, camera_type)
+    __draw(
+        surface,
+        __blit,
+        (image, (location.x, location.y)),
+        pygame.Rect(location.x, location.y,
+                    image.get_width(), image.get_height()).inflate(2, 2)
     )
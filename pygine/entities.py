@@ -1,7 +1,7 @@
 from enum import IntEnum
 import math
 from pygame import Rect
-from pygine.base import PygineObject
+from pygine.base import PygineObject, set_rectangle
 from pygine.draw import draw_rectangle
 from pygine.geometry import Rectangle, Circle
 from pygine import globals
@@ -14,11 +14,15 @@ from random import randint
 
 
 class Entity(PygineObject):
+    __slots__ = ("color", "layer", "remove", "spatial_index", "collision_layer", "__bounds_that_actually_draw_correctly")
+
     def __init__(self, x=0, y=0, width=1, height=1):
         super(Entity, self).__init__(x, y, width, height)
         self.color = Color.WHITE
         self.layer = 0
         self.remove = False
+        self.spatial_index = None
+        self.collision_layer = CollisionLayer.NONE
         self.__bounds_that_actually_draw_correctly = Rectangle(
             self.x, self.y, self.width, self.height, self.color, 2)
 
@@ -26,9 +30,24 @@ class Entity(PygineObject):
         self.color = color
         self.__bounds_that_actually_draw_correctly.color = color
 
+    def shift(self):
+        pass
+
+    def set_width(self, width):
+        super(Entity, self).set_width(width)
+        if self.spatial_index is not None:
+            self.spatial_index.move(self)
+
+    def set_height(self, height):
+        super(Entity, self).set_height(height)
+        if self.spatial_index is not None:
+            self.spatial_index.move(self)
+
     def set_location(self, x, y):
         super(Entity, self).set_location(x, y)
         self.__bounds_that_actually_draw_correctly.set_location(self.x, self.y)
+        if self.spatial_index is not None:
+            self.spatial_index.move(self)
 
     def update(self, delta_time, scene_data):
         raise NotImplementedError(
@@ -50,39 +69,86 @@ class Direction(IntEnum):
     RIGHT = 4
 
 
+class CollisionLayer(IntEnum):
+    "Bit flags that entities and spatial index queries use to only ever see the entities they care about."
+    NONE = 0
+    PLAYER = 1
+    CRAB = 2
+    Q_BLOCK = 4
+    BOSS = 8
+    CLAW = 16
+    BOULDER = 32
+
+
 class Kinetic(Entity):
+    # Maps the collision layer of another entity to the method that handles colliding with it.
+    COLLISION_HANDLERS = {}
+
+    __slots__ = (
+        "velocity", "gravity",
+        "default_move_speed", "move_speed", "facing", "collision_rectangles", "collision_width", "kinetic_query_result"
+    )
+
     def __init__(self, x, y, width, height, speed):
         super(Kinetic, self).__init__(x, y, width, height)
         self.velocity = Vector2()
+        self.gravity = 0
         self.default_move_speed = speed
         self.move_speed = 0
         self.facing = Direction.NONE
         self.collision_rectangles = []
         self.collision_width = 0
+        self.kinetic_query_result = []
+
+    def _set_collision_rectangle(self, index, x, y, width, height):
+        "Moves one of the collision rectangles in place, and only creates it the first time around."
+        if index == len(self.collision_rectangles):
+            self.collision_rectangles.append(Rect(x, y, width, height))
+        else:
+            set_rectangle(self.collision_rectangles[index], x, y, width, height)
 
     def _update_collision_rectangles(self):
         self.collision_width = 4
-        self.collision_rectangles = [
-            Rect(self.x + 2, self.y - self.collision_width,
-                 self.width - 4, self.collision_width),
-            Rect(self.x + 2, self.y + self.height,
-                 self.width - 4, self.collision_width),
-            Rect(self.x - self.collision_width, self.y + self.collision_width * 2,
-                 self.collision_width, self.height - self.collision_width * 2 * 2),
-            Rect(self.x + self.width, self.y + self.collision_width * 2,
-                 self.collision_width, self.height - self.collision_width * 2 * 2)
-        ]
+        self._set_collision_rectangle(0, self.x + 2, self.y - self.collision_width,
+                                      self.width - 4, self.collision_width)
+        self._set_collision_rectangle(1, self.x + 2, self.y + self.height,
+                                      self.width - 4, self.collision_width)
+        self._set_collision_rectangle(2, self.x - self.collision_width, self.y + self.collision_width * 2,
+                                      self.collision_width, self.height - self.collision_width * 2 * 2)
+        self._set_collision_rectangle(3, self.x + self.width, self.y + self.collision_width * 2,
+                                      self.collision_width, self.height - self.collision_width * 2 * 2)
 
     def _calculate_scaled_speed(self, delta_time):
         self.move_speed = self.default_move_speed * delta_time
 
+    def _query_kinetics(self, scene_data, area, mask):
+        "Returns the kinetic entities on the given collision layers near this one, using the scene's broadphase if it has one."
+        if scene_data.broadphase != None:
+            del self.kinetic_query_result[:]
+            for e in scene_data.broadphase.get_contacts(self):
+                if e.collision_layer & mask:
+                    self.kinetic_query_result.append(e)
+            return self.kinetic_query_result
+
+        self.kinetic_query_result = scene_data.kinetic_grid.query(area, self.kinetic_query_result, mask)
+        return self.kinetic_query_result
+
+    def _handle_collisions(self, entities, scene_data):
+        for e in entities:
+            if e is self:
+                continue
+
+            handler = self.COLLISION_HANDLERS.get(e.collision_layer)
+            if handler != None:
+                handler(self, e, scene_data)
+
     def _apply_force(self, delta_time):
         raise NotImplementedError(
             "A class that inherits Kinetic did not implement the _apply_force(delta_time) method")
 
     def _collision(self, scene_data):
         raise NotImplementedError(
-            "A class that inherits Kinetic did not implement the _collision(entities, entity_quad_tree) method")
+            "A class that inherits Kinetic did not implement the _collision(scene_data) method")
 
     def update(self, delta_time, scene_data):
         raise NotImplementedError(
@@ -99,6 +165,8 @@ class Kinetic(Entity):
 
 
 class Actor(Kinetic):
+    __slots__ = ()
+
     def __init__(self, x, y, width, height, speed):
         super(Actor, self).__init__(x, y, width, height, speed)
 
@@ -108,13 +176,23 @@ class Actor(Kinetic):
 
 
 class Player(Actor):
+    __slots__ = (
+        "sprite", "walk_animation", "direction", "area", "query_result", "solid_query_result", "default_jump_height",
+        "jump_duration", "default_run_acceleration", "default_ground_friction", "default_air_friction",
+        "jump_initial_velocity", "lateral_acceleration", "ground_friction", "air_friction", "grounded", "jumping",
+        "attempt_block_shift", "attacked", "restart", "pause", "transitioning", "restart_delay", "queue_restart",
+        "__friction_target"
+    )
+
     def __init__(self, x, y):
         super(Player, self).__init__(x, y, 12, 28, 100)
+        self.collision_layer = CollisionLayer.PLAYER
         self.sprite = Sprite(self.x - 10, self.y - 16, SpriteType.PLAYER)
         self.walk_animation = Animation(6, 6, 100)
         self.direction = Direction.NONE
         self.area = None
-        self.query_result = None
+        self.query_result = []
+        self.solid_query_result = []
 
         self.default_jump_height = 16 * 4
         self.jump_duration = 1
@@ -139,6 +217,8 @@ class Player(Actor):
         self.restart_delay = Timer(2600)
         self.queue_restart = False
 
+        self.__friction_target = Vector2()
+
     def revive(self):
         self.grounded = False
         self.jumping = False
@@ -209,12 +289,13 @@ class Player(Actor):
             (not pressing(InputType.LEFT) and not pressing(InputType.RIGHT)) or
             (pressing(InputType.LEFT) and pressing(InputType.RIGHT))
         ):
+            self.__friction_target.y = self.velocity.y
             if self.grounded:
                 self.velocity.lerp(
-                    Vector2(0, self.velocity.y), self.ground_friction)
+                    self.__friction_target, self.ground_friction)
             else:
                 self.velocity.lerp(
-                    Vector2(0, self.velocity.y), self.air_friction)
+                    self.__friction_target, self.air_friction)
 
             if self.velocity.x > -0.1 and self.velocity.x < 0.1:
                 self.velocity.x = 0
@@ -249,25 +330,25 @@ class Player(Actor):
         if pressed(InputType.X):
             self.attempt_block_shift = True
 
-    def __rectanlge_collision_logic(self, entity):
+    def __rectanlge_collision_logic(self, bounds):
         # Bottom
-        if self.velocity.y < 0 and self.collision_rectangles[0].colliderect(entity.bounds):
-            self.set_location(self.x, entity.bounds.bottom)
+        if self.velocity.y < 0 and self.collision_rectangles[0].colliderect(bounds):
+            self.set_location(self.x, bounds.bottom)
             self.velocity.y = 0
         # Top
-        if self.velocity.y > 0 and self.collision_rectangles[1].colliderect(entity.bounds):
-            self.set_location(self.x, entity.bounds.top - self.bounds.height)
+        if self.velocity.y > 0 and self.collision_rectangles[1].colliderect(bounds):
+            self.set_location(self.x, bounds.top - self.bounds.height)
             self.grounded = True
             self.jumping = False
             self.velocity.y = 0
 
         # Right
-        if self.velocity.x < 0 and self.collision_rectangles[2].colliderect(entity.bounds):
-            self.set_location(entity.bounds.right, self.y)
+        if self.velocity.x < 0 and self.collision_rectangles[2].colliderect(bounds):
+            self.set_location(bounds.right, self.y)
             self.velocity.x = 0
         # Left
-        if self.velocity.x > 0 and self.collision_rectangles[3].colliderect(entity.bounds):
-            self.set_location(entity.bounds.left - self.bounds.width, self.y)
+        if self.velocity.x > 0 and self.collision_rectangles[3].colliderect(bounds):
+            self.set_location(bounds.left - self.bounds.width, self.y)
             self.velocity.x = 0
 
     def _collision(self, scene_data):
@@ -281,7 +362,10 @@ class Player(Actor):
             for e in scene_data.entities:
                 e.set_color(Color.WHITE)
 
-        self.area = Rect(
+        if self.area is None:
+            self.area = Rect(0, 0, 0, 0)
+        set_rectangle(
+            self.area,
             self.x - 16,
             self.y - 32,
             self.width + 16 * 2,
@@ -289,65 +373,72 @@ class Player(Actor):
         )
 
         self.grounded = False
-        self.query_result = scene_data.entity_quad_tree.query(self.area)
+        self.query_result = scene_data.entity_index.query(
+            self.area, self.query_result, CollisionLayer.Q_BLOCK | CollisionLayer.BOSS)
 
         if self.attempt_block_shift:
             self.__shift_blocks(scene_data)
 
         self.attempt_block_shift = False
 
-        for e in self.query_result:
-            if e is self:
-                continue
+        self.solid_query_result = scene_data.collision_map.query(self.area, self.solid_query_result)
+        for r in self.solid_query_result:
+            self.__rectanlge_collision_logic(r)
+            self._update_collision_rectangles()
 
-            if (globals.debugging):
+        if (globals.debugging):
+            for e in self.query_result:
                 e.set_color(Color.RED)
+        self._handle_collisions(self.query_result, scene_data)
 
-            if isinstance(e, Block):
-                self.__rectanlge_collision_logic(e)
-                self._update_collision_rectangles()
-
-            if isinstance(e, QBlock):
-                if e.active:
-                    self.__rectanlge_collision_logic(e)
-                    self._update_collision_rectangles()
-
-            if isinstance(e, BossCrab):
-                if (
-                    not e.hurt and
-                    not self.grounded and
-                    self.velocity.y > 0 and
-                    self.collision_rectangles[1].colliderect(e.bounds)
-                ):
-                    e.bop_on_head()
-                    self.velocity.y = -self.jump_initial_velocity * 0.35
-                    if not e.injured:
-                        play_sound("pain.wav", 0.4)
-                    else:
-                        play_sound("pain.wav", 0.2)
-
-        self.query_result = scene_data.kinetic_quad_tree.query(self.area)
-        for e in self.query_result:
-            if e is self:
-                continue
-
-            if (globals.debugging):
+        kinetics = self._query_kinetics(scene_data, self.area, CollisionLayer.CRAB)
+        if (globals.debugging):
+            for e in kinetics:
                 e.set_color(Color.RED)
+        self._handle_collisions(kinetics, scene_data)
 
-            if isinstance(e, Crab):
-                if not e.dead:
-                    if (
-                        not e.aggravated and
-                        not self.grounded and
-                        self.velocity.y > 0 and
-                        self.collision_rectangles[1].colliderect(e.bounds)
-                    ):
-                        e.squish()
-                        self.velocity.y = -self.jump_initial_velocity * 0.35
-                        play_sound("bop.wav")
-
-                    elif e.aggravated and self.bounds.colliderect(e.bounds):
-                        self.__finessed_by_enemy()
+    def __collide_with_q_block(self, e, scene_data):
+        if e.active:
+            self.__rectanlge_collision_logic(e.bounds)
+            self._update_collision_rectangles()
+
+    def __collide_with_boss(self, e, scene_data):
+        if (
+            not e.hurt and
+            not self.grounded and
+            self.velocity.y > 0 and
+            self.collision_rectangles[1].colliderect(e.bounds)
+        ):
+            e.bop_on_head()
+            self.velocity.y = -self.jump_initial_velocity * 0.35
+            if not e.injured:
+                play_sound("pain.wav", 0.4)
+            else:
+                play_sound("pain.wav", 0.2)
+
+    def __collide_with_crab(self, e, scene_data):
+        if not e.dead:
+            if (
+                not e.aggravated and
+                not self.grounded and
+                self.velocity.y > 0 and
+                self.collision_rectangles[1].colliderect(e.bounds)
+            ):
+                e.squish()
+                self.velocity.y = -self.jump_initial_velocity * 0.35
+                play_sound("bop.wav")
+
+            elif e.aggravated and self.bounds.colliderect(e.bounds):
+                self.__finessed_by_enemy()
+
+    COLLISION_HANDLERS = {
+        CollisionLayer.Q_BLOCK: __collide_with_q_block,
+        CollisionLayer.BOSS: __collide_with_boss,
+        CollisionLayer.CRAB: __collide_with_crab
+    }
+
+    # Every entity on these layers reacts to a quantum shift through its shift() method.
+    SHIFTABLE_LAYERS = (CollisionLayer.Q_BLOCK, CollisionLayer.CRAB)
 
     def __jump(self, delta_time):
         self.velocity.y = -self.jump_initial_velocity
@@ -355,19 +446,13 @@ class Player(Actor):
 
     def __shift_blocks(self, scene_data):
         for e in self.query_result:
-            if e is self:
-                continue
+            if e.collision_layer == CollisionLayer.Q_BLOCK and self.bounds.colliderect(e.bounds):
+                play_sound("shift_fail.wav")
+                return
 
-            if isinstance(e, QBlock):
-                if self.bounds.colliderect(e.bounds):
-                    play_sound("shift_fail.wav")
-                    return
-
-        for e in scene_data.entities:
-            if isinstance(e, QBlock):
-                e.toggle()
-            elif isinstance(e, Crab):
-                e.toggle_aggravation()
+        for layer in Player.SHIFTABLE_LAYERS:
+            for e in scene_data.registry.get(layer):
+                e.shift()
 
         play_sound("shift.wav")
 
@@ -432,13 +517,21 @@ class Player(Actor):
 
 
 class Crab(Kinetic):
+    __slots__ = (
+        "sprite", "walk_animation", "direction", "area", "query_result", "solid_query_result", "default_jump_height",
+        "jump_duration", "jump_initial_velocity", "lateral_acceleration", "aggravated_move_speed", "internal_bounds",
+        "grounded", "aggravated", "dead"
+    )
+
     def __init__(self, x, y):
         super(Crab, self).__init__(x, y, 11, 9, 25)
+        self.collision_layer = CollisionLayer.CRAB
         self.sprite = Sprite(self.x - 18, self.y - 19, SpriteType.CRAB)
         self.walk_animation = Animation(4, 4, 150)
         self.direction = Direction.RIGHT
         self.area = None
-        self.query_result = None
+        self.query_result = []
+        self.solid_query_result = []
 
         self.default_jump_height = 16 * 1.5
         self.jump_duration = 0.5
@@ -458,7 +551,7 @@ class Crab(Kinetic):
     def set_location(self, x, y):
         super(Crab, self).set_location(x, y)
         self.sprite.set_location(self.x - 18, self.y - 19)
-        self.internal_bounds = Rect(self.x + 5, self.y + 5, 1, 1)
+        set_rectangle(self.internal_bounds, self.x + 5, self.y + 5, 1, 1)
 
     def toggle_aggravation(self):
         if self.dead:
@@ -466,6 +559,9 @@ class Crab(Kinetic):
 
         self.aggravated = not self.aggravated
 
+    def shift(self):
+        self.toggle_aggravation()
+
     def squish(self):
         self.dead = True
         self.velocity.y = -self.jump_initial_velocity * 0.75
@@ -496,37 +592,35 @@ class Crab(Kinetic):
 
     def _update_collision_rectangles(self):
         self.collision_width = 3
-        self.collision_rectangles = [
-            Rect(self.x + 2, self.y - self.collision_width * 2,
-                 self.width - 4, self.collision_width * 2),
-            Rect(self.x + 2, self.y + self.height,
-                 self.width - 4, self.collision_width * 2),
-            Rect(self.x - self.collision_width, self.y + self.collision_width,
-                 self.collision_width, self.height - self.collision_width * 2),
-            Rect(self.x + self.width, self.y + self.collision_width,
-                 self.collision_width, self.height - self.collision_width * 2)
-        ]
-
-    def __rectanlge_collision_logic(self, entity):
+        self._set_collision_rectangle(0, self.x + 2, self.y - self.collision_width * 2,
+                                      self.width - 4, self.collision_width * 2)
+        self._set_collision_rectangle(1, self.x + 2, self.y + self.height,
+                                      self.width - 4, self.collision_width * 2)
+        self._set_collision_rectangle(2, self.x - self.collision_width, self.y + self.collision_width,
+                                      self.collision_width, self.height - self.collision_width * 2)
+        self._set_collision_rectangle(3, self.x + self.width, self.y + self.collision_width,
+                                      self.collision_width, self.height - self.collision_width * 2)
+
+    def __rectanlge_collision_logic(self, bounds):
         # Bottom
-        if self.velocity.y < 0 and self.collision_rectangles[0].colliderect(entity.bounds):
-            self.set_location(self.x, entity.bounds.bottom)
+        if self.velocity.y < 0 and self.collision_rectangles[0].colliderect(bounds):
+            self.set_location(self.x, bounds.bottom)
             self.velocity.y = 0
 
         # Top
-        if self.velocity.y > 0 and self.collision_rectangles[1].colliderect(entity.bounds):
-            self.set_location(self.x, entity.bounds.top - self.bounds.height)
+        if self.velocity.y > 0 and self.collision_rectangles[1].colliderect(bounds):
+            self.set_location(self.x, bounds.top - self.bounds.height)
             self.velocity.y = 0
             self.grounded = True
 
         # Right
-        if self.velocity.x < 0 and self.collision_rectangles[2].colliderect(entity.bounds):
-            self.set_location(entity.bounds.right, self.y)
+        if self.velocity.x < 0 and self.collision_rectangles[2].colliderect(bounds):
+            self.set_location(bounds.right, self.y)
             self.velocity.x = 0
             self.direction = Direction.RIGHT
         # Left
-        if self.velocity.x > 0 and self.collision_rectangles[3].colliderect(entity.bounds):
-            self.set_location(entity.bounds.left - self.bounds.width, self.y)
+        if self.velocity.x > 0 and self.collision_rectangles[3].colliderect(bounds):
+            self.set_location(bounds.left - self.bounds.width, self.y)
             self.velocity.x = 0
             self.direction = Direction.LEFT
 
@@ -548,41 +642,46 @@ class Crab(Kinetic):
         if self.y > scene_data.scene_bounds.height + 64:
             self.squish()
 
-        self.area = Rect(
+        if self.area is None:
+            self.area = Rect(0, 0, 0, 0)
+        set_rectangle(
+            self.area,
             self.x - 16,
             self.y - 16,
             self.width + 16 * 2,
             self.height + 16 * 2
         )
-        self.query_result = scene_data.entity_quad_tree.query(self.area)
-
         self.grounded = False
 
-        for e in self.query_result:
-            if e is self:
-                continue
+        self.solid_query_result = scene_data.collision_map.query(self.area, self.solid_query_result)
+        for r in self.solid_query_result:
+            self.__rectanlge_collision_logic(r)
+            self._update_collision_rectangles()
 
-            if isinstance(e, Block):
-                self.__rectanlge_collision_logic(e)
-                self._update_collision_rectangles()
+        self.query_result = scene_data.entity_index.query(
+            self.area, self.query_result, CollisionLayer.Q_BLOCK)
+        self._handle_collisions(self.query_result, scene_data)
 
-            elif isinstance(e, QBlock):
-                if e.active:
+        self._handle_collisions(self._query_kinetics(
+            scene_data, self.area, CollisionLayer.CRAB), scene_data)
 
-                    if not self.dead and self.internal_bounds.colliderect(e.bounds):
-                        self.squish()
+    def __collide_with_q_block(self, e, scene_data):
+        if e.active:
 
-                    self.__rectanlge_collision_logic(e)
-                    self._update_collision_rectangles()
+            if not self.dead and self.internal_bounds.colliderect(e.bounds):
+                self.squish()
 
-        self.query_result = scene_data.kinetic_quad_tree.query(self.area)
-        for e in self.query_result:
-            if e is self:
-                continue
+            self.__rectanlge_collision_logic(e.bounds)
+            self._update_collision_rectangles()
+
+    def __collide_with_crab(self, e, scene_data):
+        self.__rectanlge_collision_logic(e.bounds)
+        self._update_collision_rectangles()
 
-            if isinstance(e, Crab):
-                self.__rectanlge_collision_logic(e)
-                self._update_collision_rectangles()
+    COLLISION_HANDLERS = {
+        CollisionLayer.Q_BLOCK: __collide_with_q_block,
+        CollisionLayer.CRAB: __collide_with_crab
+    }
 
     def __update_ai(self, scene_data):
         if self.dead:
@@ -627,8 +726,15 @@ class Crab(Kinetic):
 
 
 class BossCrab(Entity):
+    __slots__ = (
+        "body", "bandaid", "face", "emote", "state_index", "total_flashes", "flashes", "flash_duration",
+        "invinsibility_flash_timer", "hurt", "flashing", "injured", "crab_smash", "sync_smash", "special_attack",
+        "idle_timer"
+    )
+
     def __init__(self):
         super(BossCrab, self).__init__(96, 128, 128, 8)
+        self.collision_layer = CollisionLayer.BOSS
         self.body = Sprite(self.x - 64, self.y - 32, SpriteType.CRAB_BOSS_BODY)    
         self.bandaid = Sprite(self.x + 2 * 16, self.y - 1 * 16, SpriteType.CRAB_BOSS_BANDAID)
         self.face = Sprite(self.x + 2 * 16, self.y + 2 * 16, SpriteType.CRAB_FACE_SLEEPING)
@@ -717,8 +823,11 @@ class BossCrab(Entity):
 
 
 class Claw(Kinetic):
+    __slots__ = ("boss", "is_left", "sprite", "initial_y", "windup", "slamming", "cooldown", "needs_setup")
+
     def __init__(self, boss, is_left):
         super(Claw, self).__init__(96, 128, 56, 74, 200)
+        self.collision_layer = CollisionLayer.CLAW
         self.boss = boss
         self.is_left = is_left
 
@@ -745,16 +854,14 @@ class Claw(Kinetic):
 
     def _update_collision_rectangles(self):
         self.collision_width = 3
-        self.collision_rectangles = [
-            Rect(self.x + 2, self.y - self.collision_width * 2,
-                 self.width - 4, self.collision_width * 2),
-            Rect(self.x + 2, self.y + self.height,
-                 self.width - 4, self.collision_width * 2),
-            Rect(self.x - self.collision_width, self.y + self.collision_width,
-                 self.collision_width, self.height - self.collision_width * 2),
-            Rect(self.x + self.width, self.y + self.collision_width,
-                 self.collision_width, self.height - self.collision_width * 2)
-        ]
+        self._set_collision_rectangle(0, self.x + 2, self.y - self.collision_width * 2,
+                                      self.width - 4, self.collision_width * 2)
+        self._set_collision_rectangle(1, self.x + 2, self.y + self.height,
+                                      self.width - 4, self.collision_width * 2)
+        self._set_collision_rectangle(2, self.x - self.collision_width, self.y + self.collision_width,
+                                      self.collision_width, self.height - self.collision_width * 2)
+        self._set_collision_rectangle(3, self.x + self.width, self.y + self.collision_width,
+                                      self.collision_width, self.height - self.collision_width * 2)
 
     def _collision(self, scene_data):
         if (
@@ -845,8 +952,11 @@ class Claw(Kinetic):
 
 
 class Boulder(Kinetic):
+    __slots__ = ("radius", "sprite", "center", "default_gravity", "circle", "__actor_corner")
+
     def __init__(self, x, y):
         super(Boulder, self).__init__(x, y, 0, 0, 0)
+        self.collision_layer = CollisionLayer.BOULDER
         if randint(1, 10) % 2 == 0:
             self.sprite = Sprite(self.x, self.y, SpriteType.FALLING_ROCK_BIG)
             self.radius = 16
@@ -863,11 +973,13 @@ class Boulder(Kinetic):
         self.gravity = 0
 
         self.circle = Circle(self.center.x, self.center.y, self.radius, Color.GREEN, 2)
+        self.__actor_corner = Vector2()
 
     def set_location(self, x, y):
         super(Boulder, self).set_location(x, y)
         self.sprite.set_location(self.x, self.y)
-        self.center = Vector2(self.x + self.radius, self.y + self.radius)
+        self.center.x = self.x + self.radius
+        self.center.y = self.y + self.radius
         self.circle.set_location(self.center.x, self.center.y)
 
     def _calculate_scaled_speed(self, delta_time):
@@ -883,22 +995,22 @@ class Boulder(Kinetic):
 
     def _update_collision_rectangles(self):
         self.collision_width = 3
-        self.collision_rectangles = [
-            Rect(self.x + 2, self.y - self.collision_width * 2,
-                 self.width - 4, self.collision_width * 2),
-            Rect(self.x + 2, self.y + self.height,
-                 self.width - 4, self.collision_width * 2),
-            Rect(self.x - self.collision_width, self.y + self.collision_width,
-                 self.collision_width, self.height - self.collision_width * 2),
-            Rect(self.x + self.width, self.y + self.collision_width,
-                 self.collision_width, self.height - self.collision_width * 2)
-        ]
+        self._set_collision_rectangle(0, self.x + 2, self.y - self.collision_width * 2,
+                                      self.width - 4, self.collision_width * 2)
+        self._set_collision_rectangle(1, self.x + 2, self.y + self.height,
+                                      self.width - 4, self.collision_width * 2)
+        self._set_collision_rectangle(2, self.x - self.collision_width, self.y + self.collision_width,
+                                      self.collision_width, self.height - self.collision_width * 2)
+        self._set_collision_rectangle(3, self.x + self.width, self.y + self.collision_width,
+                                      self.collision_width, self.height - self.collision_width * 2)
 
     def _collision(self, scene_data):
         if self.y + self.height > scene_data.scene_bounds.height + 64:
             self.remove = True
 
-        if Vector2.distance_between(Vector2(scene_data.actor.x + scene_data.actor.width, scene_data.actor.y + scene_data.actor.height), self.center) < self.radius:
+        self.__actor_corner.x = scene_data.actor.x + scene_data.actor.width
+        self.__actor_corner.y = scene_data.actor.y + scene_data.actor.height
+        if Vector2.distance_between(self.__actor_corner, self.center) < self.radius:
             scene_data.actor.get_yeeted()
 
     def update(self, delta_time, scene_data):
@@ -919,6 +1031,8 @@ class Boulder(Kinetic):
 
 
 class Block(Entity):
+    __slots__ = ()
+
     def __init__(self, x, y, width, height):
         super(Block, self).__init__(x, y, width, height)
         #self.sprite = Sprite(self.x, self.y, SpriteType.SOLID_BLOCK)
@@ -936,8 +1050,11 @@ class Block(Entity):
 
 
 class QBlock(Entity):
+    __slots__ = ("active", "sprite")
+
     def __init__(self, x, y, type):
         super(QBlock, self).__init__(x, y, 16, 16)
+        self.collision_layer = CollisionLayer.Q_BLOCK
         self.active = False
         if type == 0:
             self.sprite = Sprite(self.x, self.y, SpriteType.Q_BLOCK_0)
@@ -953,6 +1070,9 @@ class QBlock(Entity):
         else:
             self.sprite.increment_sprite_y(-16)
 
+    def shift(self):
+        self.toggle()
+
     def update(self, delta_time, scene_data):
         pass
 
@@ -1,10 +1,12 @@
 from pygame import Rect
-from pygine.base import PygineObject
+from pygine.base import PygineObject, set_rectangle
 from pygine.draw import draw_rectangle, draw_circle
 from pygine.utilities import CameraType, Color
 
 
 class Shape(PygineObject):
+    __slots__ = ("color", "thickness")
+
     def __init__(self, x, y, width, height, color):
         super(Shape, self).__init__(x, y, width, height)
         self.color = color
@@ -20,6 +22,8 @@ class Shape(PygineObject):
 
 
 class Rectangle(Shape):
+    __slots__ = ("rectangles",)
+
     def __init__(self, x, y, width, height, color=Color.WHITE, thickness=0):
         super(Rectangle, self).__init__(x, y, width, height, color)
         self.set_thickness(thickness)
@@ -29,40 +33,50 @@ class Rectangle(Shape):
         if self.thickness == 0:
             self.rectangles = [self.bounds]
         else:
-            self.rectangles = [
-                # Top
-                Rect(
-                    self.x,
-                    self.y,
-                    self.width,
-                    self.thickness
-                ),
-                # Right
-                Rect(
-                    self.x + self.width - self.thickness,
-                    self.y + self.thickness,
-                    self.thickness,
-                    self.height - self.thickness * 2
-                ),
-                # Bottom
-                Rect(
-                    self.x,
-                    self.y + self.height - self.thickness,
-                    self.width,
-                    self.thickness
-                ),
-                # Left
-                Rect(
-                    self.x,
-                    self.y + self.thickness,
-                    self.thickness,
-                    self.height - self.thickness * 2
-                ),
-            ]
+            self.rectangles = [Rect(0, 0, 0, 0), Rect(0, 0, 0, 0), Rect(0, 0, 0, 0), Rect(0, 0, 0, 0)]
+            self.__place_rectangles()
+
+    def __place_rectangles(self):
+        if self.thickness == 0:
+            # The only rectangle is the bounds, which already moved.
+            return
+
+        # Top
+        set_rectangle(
+            self.rectangles[0],
+            self.x,
+            self.y,
+            self.width,
+            self.thickness
+        )
+        # Right
+        set_rectangle(
+            self.rectangles[1],
+            self.x + self.width - self.thickness,
+            self.y + self.thickness,
+            self.thickness,
+            self.height - self.thickness * 2
+        )
+        # Bottom
+        set_rectangle(
+            self.rectangles[2],
+            self.x,
+            self.y + self.height - self.thickness,
+            self.width,
+            self.thickness
+        )
+        # Left
+        set_rectangle(
+            self.rectangles[3],
+            self.x,
+            self.y + self.thickness,
+            self.thickness,
+            self.height - self.thickness * 2
+        )
 
     def set_location(self, x, y):
         super(Rectangle, self).set_location(x, y)
-        self.reset()
+        self.__place_rectangles()
 
     def set_thickness(self, thickness):
         self.thickness = thickness
@@ -80,6 +94,8 @@ class Rectangle(Shape):
 
 
 class Circle(Shape):
+    __slots__ = ("radius",)
+
     def __init__(self, x, y, radius, color=Color.WHITE, thickness=0):
         super(Circle, self).__init__(x, y, radius, radius, color)
         self.radius = radius
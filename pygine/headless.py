@@ -0,0 +1,83 @@
+import argparse
+import os
+import random
+import time
+
+# The dummy drivers have to be picked before pygame initializes its display and mixer.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from pygine.input import ScriptedInput, set_input_source
+from pygine.root import Game
+
+# Starts the game, and then keeps running right while jumping and shifting every now and then.
+DEFAULT_SCRIPT = """
+10
+5 j
+60
+25 d
+15 d j
+10 d
+3 d u
+"""
+
+
+def run(frames, script=DEFAULT_SCRIPT, loop=True, tick_rate=60, draw=True, seed=None, profile_path=None,
+        trace_path=None):
+    "Plays the game for the given number of frames without a display, and returns the game and how many seconds it took."
+    if seed is not None:
+        random.seed(seed)
+
+    set_input_source(ScriptedInput.parse(script, loop))
+    game = Game(tick_rate=tick_rate, headless=True, profile_path=profile_path, trace_path=trace_path)
+
+    start = time.perf_counter()
+    game.run(frames, draw)
+    seconds = time.perf_counter() - start
+
+    set_input_source(None)
+    return game, seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates Quantum Caverns without a display.")
+    parser.add_argument("--frames", type=int, default=3600,
+                        help="how many frames to simulate")
+    parser.add_argument("--script",
+                        help="a file with lines like \"120 d j\", holding down d and j for 120 frames")
+    parser.add_argument("--no-loop", action="store_true",
+                        help="let go of every key once the script ends, instead of starting it over")
+    parser.add_argument("--tick-rate", type=int, default=60,
+                        help="how many ticks make up a second of game time")
+    parser.add_argument("--no-draw", action="store_true",
+                        help="only simulate, and skip drawing every frame")
+    parser.add_argument("--seed", type=int,
+                        help="seeds the random number generator, so runs can be compared")
+    parser.add_argument("--profile",
+                        help="times every phase of every frame, and writes them to this .csv or .json file")
+    parser.add_argument("--trace",
+                        help="records what the engine is doing, and writes it to this .json file for chrome://tracing")
+    arguments = parser.parse_args()
+
+    script = DEFAULT_SCRIPT
+    if arguments.script is not None:
+        with open(arguments.script) as f:
+            script = f.read()
+
+    game, seconds = run(
+        arguments.frames,
+        script,
+        not arguments.no_loop,
+        arguments.tick_rate,
+        not arguments.no_draw,
+        arguments.seed,
+        arguments.profile,
+        arguments.trace
+    )
+
+    print("Simulated {} frames in {:.2f} s ({:.0f} frames/s), ending in the {} scene.".format(
+        arguments.frames,
+        seconds,
+        arguments.frames / seconds,
+        type(game.scene_manager.get_current_scene()).__name__
+    ))
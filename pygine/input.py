@@ -26,6 +26,73 @@ class InputType(IntEnum):
 
 current_key_state = None
 previous_key_state = None
+input_source = None
+
+
+class KeyState(object):
+    "Looks like the result of pygame.key.get_pressed(), but only the given keys are held down."
+    __slots__ = ("keys",)
+
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class ScriptedInput(object):
+    "An input source that plays back a script of (frames, keys) steps, holding down the keys of every step for that many frames."
+
+    def __init__(self, steps, loop=False):
+        assert (len(steps) > 0), \
+            "A ScriptedInput needs at least one step!"
+
+        self.steps = [(frames, KeyState(keys)) for frames, keys in steps]
+        self.loop = loop
+        self.__step = 0
+        self.__frames = 0
+
+    @staticmethod
+    def parse(text, loop=False):
+        "Creates a ScriptedInput from lines like \"120 d j\", which holds down d and j for 120 frames. Keys are named like pygame's K_ constants."
+        steps = []
+        for line in text.splitlines():
+            line = line.split("#")[0].split()
+            if len(line) == 0:
+                continue
+            keys = []
+            for name in line[1:]:
+                assert (hasattr(pygame, "K_" + name)), \
+                    "\"" + name + "\" is not a key pygame knows about!"
+                keys.append(getattr(pygame, "K_" + name))
+            steps.append((int(line[0]), keys))
+        return ScriptedInput(steps, loop)
+
+    def __call__(self):
+        if self.__step >= len(self.steps):
+            return KeyState()
+
+        frames, key_state = self.steps[self.__step]
+        self.__frames += 1
+        if self.__frames >= frames:
+            self.__frames = 0
+            self.__step += 1
+            if self.loop and self.__step >= len(self.steps):
+                self.__step = 0
+
+        return key_state
+
+
+def set_input_source(source):
+    "Makes update_input() read the keyboard through source() instead of pygame.key.get_pressed(). Pass None to use the real keyboard again."
+    global input_source
+    input_source = source
+
+
+def __get_key_state():
+    if input_source is None:
+        return pygame.key.get_pressed()
+    return input_source()
 
 
 def update_input():
@@ -33,10 +100,10 @@ def update_input():
     global previous_key_state
 
     previous_key_state = current_key_state
-    current_key_state = pygame.key.get_pressed()
+    current_key_state = __get_key_state()
 
     if previous_key_state == None:
-        previous_key_state = pygame.key.get_pressed()
+        previous_key_state = current_key_state
 
 def pressed(type):
     "Returns True if the key was just pressed and not held down the previous frame."
@@ -0,0 +1,107 @@
+import json
+import os
+import sys
+from array import array
+from enum import IntEnum
+
+ASSET_PATH = os.path.dirname(os.path.abspath(__file__)) + "/assets/"
+LEVEL_DIRECTORIES = ["levels/", "bosses/"]
+
+# A compiled level is MAGIC, followed by a little-endian int16 array of [VERSION, total records, records...],
+# where each record is (TileType, x, y, width, height).
+MAGIC = b"QCLV"
+VERSION = 1
+RECORD_LENGTH = 5
+
+
+class TileType(IntEnum):
+    BLOCK = 0
+    PLAYER = 36
+    CRAB = 38
+    Q_BLOCK_0 = 81
+    Q_BLOCK_1 = 82
+
+
+def parse_tiled_level(path):
+    "Returns the (TileType, x, y, width, height) of everything a Tiled export spawns, in file order."
+    result = []
+
+    with open(path) as json_file:
+        data = json.load(json_file)
+
+        for layer in data["layers"]:
+
+            if layer["name"] == "blocks":
+                array_data = layer["data"]
+                for i in range(len(array_data)):
+                    if array_data[i] in (TileType.PLAYER, TileType.CRAB, TileType.Q_BLOCK_0, TileType.Q_BLOCK_1):
+                        result.append((
+                            TileType(array_data[i]),
+                            int(i % layer["width"]) * 16,
+                            int(i / layer["width"]) * 16,
+                            16,
+                            16
+                        ))
+
+            if layer["name"] == "rectangles":
+                for rectangle in layer["objects"]:
+                    result.append((
+                        TileType.BLOCK,
+                        int(rectangle["x"]),
+                        int(rectangle["y"]),
+                        int(rectangle["width"]),
+                        int(rectangle["height"])
+                    ))
+
+    return result
+
+
+def compile_level(json_path, compiled_path):
+    spawns = parse_tiled_level(json_path)
+
+    data = array("h", [VERSION, len(spawns)])
+    for spawn in spawns:
+        data.extend(int(value) for value in spawn)
+    if sys.byteorder == "big":
+        data.byteswap()
+
+    with open(compiled_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(data.tobytes())
+
+
+def read_compiled_level(path):
+    "Returns the (TileType, x, y, width, height) records of a compiled level using a single read."
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    assert (raw[:len(MAGIC)] == MAGIC), \
+        path + " is not a compiled level! Run `python -m pygine.manifest` to rebuild the levels."
+
+    data = array("h")
+    data.frombytes(raw[len(MAGIC):])
+    if sys.byteorder == "big":
+        data.byteswap()
+
+    assert (data[0] == VERSION), \
+        path + " was compiled by an older version! Run `python -m pygine.manifest` to rebuild the levels."
+
+    result = []
+    for i in range(2, 2 + data[1] * RECORD_LENGTH, RECORD_LENGTH):
+        result.append((TileType(data[i]), data[i + 1], data[i + 2], data[i + 3], data[i + 4]))
+    return result
+
+
+def compile_levels():
+    "Compiles every Tiled export in the level folders next to its json file. Returns the number of levels compiled."
+    total = 0
+    for directory in LEVEL_DIRECTORIES:
+        for f in os.listdir(ASSET_PATH + directory):
+            name, extension = os.path.splitext(f)
+            if extension == ".json" and name.isdigit():
+                compile_level(
+                    ASSET_PATH + directory + f,
+                    ASSET_PATH + directory + name + ".bin"
+                )
+                total += 1
+    return total
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import pygame
+from pygine.levels import compile_levels
+
+ASSET_PATH = os.path.dirname(os.path.abspath(__file__)) + "/assets/"
+MANIFEST_PATH = ASSET_PATH + "manifest.json"
+MANIFEST_VERSION = 2
+
+
+def __describe_file(relative_path):
+    path = ASSET_PATH + relative_path
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+
+    result = {
+        "path": relative_path,
+        "size": os.path.getsize(path),
+        "sha1": digest
+    }
+
+    if relative_path.endswith(".png"):
+        image = pygame.image.load(path)
+        result["width"] = image.get_width()
+        result["height"] = image.get_height()
+
+    return result
+
+
+def __numbered_files(directory, extension):
+    ids = []
+    for f in os.listdir(ASSET_PATH + directory):
+        name, file_extension = os.path.splitext(f)
+        if file_extension == extension and name.isdigit():
+            ids.append(int(name))
+    ids.sort()
+    return ids
+
+
+def __describe_levels(directory):
+    levels = []
+    for i in __numbered_files(directory, ".json"):
+        levels.append({
+            "id": i,
+            "data": __describe_file(directory + str(i) + ".json"),
+            "compiled": __describe_file(directory + str(i) + ".bin"),
+            "image": __describe_file(directory + str(i) + ".png")
+        })
+    return levels
+
+
+def build_manifest():
+    "Scans the assets folder and returns a description of every level, boss and background layer."
+    return {
+        "version": MANIFEST_VERSION,
+        "levels": __describe_levels("levels/"),
+        "bosses": __describe_levels("bosses/"),
+        "layers": [
+            {
+                "id": i,
+                "image": __describe_file("sprites/layers/" + str(i) + ".png")
+            }
+            for i in __numbered_files("sprites/layers/", ".png")
+        ]
+    }
+
+
+def write_manifest(manifest, path=MANIFEST_PATH):
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def load_manifest(path=MANIFEST_PATH):
+    assert (os.path.isfile(path)), \
+        "Could not find the asset manifest! Run `python -m pygine.manifest` to generate it."
+
+    with open(path) as f:
+        manifest = json.load(f)
+
+    assert (manifest["version"] == MANIFEST_VERSION), \
+        "The asset manifest is out of date! Run `python -m pygine.manifest` to regenerate it."
+
+    return manifest
+
+
+def get_files(manifest):
+    "Returns the description of every file listed in the manifest."
+    result = []
+    for level in manifest["levels"] + manifest["bosses"]:
+        result.append(level["data"])
+        result.append(level["compiled"])
+        result.append(level["image"])
+    for layer in manifest["layers"]:
+        result.append(layer["image"])
+    return result
+
+
+def validate_manifest(manifest, check_hashes=False):
+    "Returns a list of problems with the assets described by the manifest. Sizes are always checked, hashes only on request."
+    problems = []
+    for description in get_files(manifest):
+        path = ASSET_PATH + description["path"]
+
+        if not os.path.isfile(path):
+            problems.append(description["path"] + " is missing")
+            continue
+
+        if os.path.getsize(path) != description["size"]:
+            problems.append(description["path"] + " has changed size")
+            continue
+
+        if check_hashes:
+            with open(path, "rb") as f:
+                if hashlib.sha1(f.read()).hexdigest() != description["sha1"]:
+                    problems.append(description["path"] + " has changed")
+
+    return problems
+
+
+if __name__ == "__main__":
+    compile_levels()
+    manifest = build_manifest()
+    write_manifest(manifest)
+    print(
+        "Wrote " + MANIFEST_PATH + " (" +
+        str(len(manifest["levels"])) + " levels, " +
+        str(len(manifest["bosses"])) + " bosses, " +
+        str(len(manifest["layers"])) + " layers)."
+    )
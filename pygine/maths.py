@@ -1,8 +1,9 @@
 import math
 
 
-class Vector2:
+class Vector2(object):
     "a poor man's vector class."
+    __slots__ = ("x", "y")
 
     def __init__(self, x=0.0, y=0.0):
         self.x = x
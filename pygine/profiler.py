@@ -0,0 +1,115 @@
+import csv
+import json
+import math
+import time
+from collections import deque
+
+# How many of the most recent frames the percentiles are calculated from.
+HISTORY = 300
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, percent):
+    "Returns the value below which the given percent of sorted_values fall, using the nearest rank."
+    if len(sorted_values) == 0:
+        return 0
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values))) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+class FrameProfiler(object):
+    "Times every phase of a frame, and keeps the last HISTORY frames around to calculate rolling percentiles from."
+
+    def __init__(self):
+        self.enabled = False
+        # Every phase in the order it first ran in, with the frame as a whole always coming first.
+        self.phases = ["frame"]
+        self.history = {"frame": deque(maxlen=HISTORY)}
+        self.frames = None
+
+        self.__active = False
+        self.__current = {}
+        self.__starts = {}
+        self.__frame_start = 0
+
+    def record(self):
+        "Keeps every frame from now on, not just the last HISTORY, so they can be written to a file."
+        self.frames = []
+
+    def begin_frame(self):
+        # Whether a frame is profiled is decided up front, so toggling the profiler halfway through a frame is harmless.
+        self.__active = self.enabled
+        if not self.__active:
+            return
+
+        self.__current.clear()
+        self.__frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.__active:
+            return
+
+        self.__current["frame"] = time.perf_counter() - self.__frame_start
+        for phase in self.phases:
+            self.history[phase].append(self.__current.get(phase, 0))
+        if self.frames != None:
+            self.frames.append(dict(self.__current))
+
+        self.__active = False
+
+    def begin(self, phase):
+        if not self.__active:
+            return
+
+        if phase not in self.history:
+            self.phases.append(phase)
+            self.history[phase] = deque(maxlen=HISTORY)
+        self.__starts[phase] = time.perf_counter()
+
+    def end(self, phase):
+        if not self.__active:
+            return
+
+        elapsed = time.perf_counter() - self.__starts[phase]
+        # With a fixed timestep a phase can run several times in one frame, so every run adds up.
+        self.__current[phase] = self.__current.get(phase, 0) + elapsed
+
+    def summarize(self):
+        "Returns a list of (phase, [percentiles...], maximum) in milliseconds, calculated from the last HISTORY frames."
+        result = []
+        for phase in self.phases:
+            values = sorted(self.history[phase])
+            result.append((
+                phase,
+                [percentile(values, p) * 1000 for p in PERCENTILES],
+                (values[-1] if len(values) > 0 else 0) * 1000
+            ))
+        return result
+
+    def write(self, path):
+        "Writes every recorded frame to path, as JSON if the path ends in .json and as CSV otherwise. Times are in milliseconds."
+        frames = self.frames if self.frames != None else []
+
+        if path.endswith(".json"):
+            summary = {}
+            for phase, percentiles, maximum in self.summarize():
+                summary[phase] = {"p" + str(p): v for p, v in zip(PERCENTILES, percentiles)}
+                summary[phase]["max"] = maximum
+
+            with open(path, "w") as f:
+                json.dump({
+                    "phases": self.phases,
+                    "summary": summary,
+                    "frames": [{phase: frame.get(phase, 0) * 1000 for phase in self.phases} for frame in frames]
+                }, f, indent=1)
+            return
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["index"] + self.phases)
+            for i in range(len(frames)):
+                writer.writerow([i] + ["{:.4f}".format(frames[i].get(phase, 0) * 1000) for phase in self.phases])
+
+
+# The one profiler the whole engine reports to.
+profiler = FrameProfiler()
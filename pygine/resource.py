@@ -1,10 +1,15 @@
 import os
 import pygame
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
 from pygine.base import PygineObject
 from pygine.draw import draw_image
+from pygine.levels import read_compiled_level, TileType
+from pygine.manifest import load_manifest, validate_manifest
 from pygine import globals
-from pygine.sounds import load_sound_paths
+from pygine.sounds import load_sound_paths, load_sounds
+from pygine.tracer import tracer
 from pygine.utilities import Timer
 
 
@@ -15,9 +20,22 @@ TEXT_SHEET = None
 HELP_SHEET = None
 
 TOTAL_LEVELS_LOADED = 0
-LAYER_LOOKUP = []
 TOTAL_BOSSES_LOADED = 0
-BOSS_LOOKUP = []
+MANIFEST = None
+
+# Only the current and the next level need to be in memory at any given time.
+LEVEL_IMAGE_CACHE_CAPACITY = 2
+LEVEL_IMAGE_CACHE = OrderedDict()
+BACKGROUND_CACHE = {}
+
+LEVEL_LOADER = ThreadPoolExecutor(max_workers=1)
+
+FRAME_CACHE = {}
+
+GLYPH_SIZE = 8
+GLYPHS = []
+TEXT_CACHE_CAPACITY = 64
+TEXT_CACHE = OrderedDict()
 
 def load_content():
     global SPRITE_SHEET
@@ -25,6 +43,7 @@ def load_content():
     global TEXT_SHEET
     global HELP_SHEET
 
+    tracer.begin("load_content", "load")
     path = os.path.dirname(os.path.abspath(__file__))
 
     SPRITE_SHEET = pygame.image.load(
@@ -41,41 +60,171 @@ def load_content():
         path + "/assets/sprites/title.png"
     ).convert_alpha()
 
+    FRAME_CACHE.clear()
+    precache_frames()
+    load_glyphs()
+
     pygame_is_frustrating()
     load_sound_paths()
+    load_sounds()
+    tracer.end("load_content", "load")
 
 
 def pygame_is_frustrating():
     global TOTAL_LEVELS_LOADED
     global TOTAL_BOSSES_LOADED
+    global MANIFEST
+
+    MANIFEST = load_manifest()
+    problems = validate_manifest(MANIFEST)
+    assert (len(problems) == 0), \
+        "The asset manifest does not match the assets (" + ", ".join(problems) + \
+        ")! Run `python -m pygine.manifest` to regenerate it."
+
+    TOTAL_LEVELS_LOADED = len(MANIFEST["levels"])
+    TOTAL_BOSSES_LOADED = len(MANIFEST["bosses"])
+
+    LEVEL_IMAGE_CACHE.clear()
+    BACKGROUND_CACHE.clear()
+
+
+def get_manifest():
+    return MANIFEST
+
+
+def load_layer_image(category, index):
+    "Lazily decodes the image of a level, boss or background layer. category is one of the manifest's sections."
+    path = os.path.dirname(os.path.abspath(__file__)) + "/assets/" + \
+        MANIFEST[category][index]["image"]["path"]
+
+    if category == "layers":
+        image = BACKGROUND_CACHE.get(index)
+        if image is None:
+            image = pygame.image.load(path).convert()
+            BACKGROUND_CACHE[index] = image
+        return image
+
+    key = (category, index)
+    image = LEVEL_IMAGE_CACHE.get(key)
+    if image is not None:
+        LEVEL_IMAGE_CACHE.move_to_end(key)
+        return image
+
+    image = pygame.image.load(path).convert_alpha()
+    LEVEL_IMAGE_CACHE[key] = image
+    while len(LEVEL_IMAGE_CACHE) > LEVEL_IMAGE_CACHE_CAPACITY:
+        LEVEL_IMAGE_CACHE.popitem(last=False)
+
+    return image
+
+
+class LevelData:
+    "Everything needed to build a level, parsed and decoded ahead of time."
+
+    def __init__(self, category, index):
+        self.category = category
+        self.index = index
+        self.image = None
+        # A list of (TileType, x, y, width, height) in the order they appear in the level file.
+        self.spawns = []
+
+
+def load_level_data(category, index):
+    "Reads a level's compiled spawns and decodes its image. Safe to call from a worker thread."
+    path = os.path.dirname(os.path.abspath(__file__)) + "/assets/"
+    level = MANIFEST[category][index]
+    tracer.begin("load_level_data", "load", level["image"]["path"])
+    level_data = LevelData(category, index)
+
+    level_data.spawns = read_compiled_level(path + level["compiled"]["path"])
+
+    # Converting the image requires the display, so that is left to cache_level_image() on the main thread.
+    level_data.image = pygame.image.load(path + level["image"]["path"])
+
+    tracer.end("load_level_data", "load")
+    return level_data
+
+
+def prefetch_level_data(category, index):
+    "Starts loading a level in the background. Returns a Future whose result is the level's LevelData."
+    return LEVEL_LOADER.submit(load_level_data, category, index)
+
 
-    # Load normal levels
-    path = os.path.dirname(os.path.abspath(__file__)) + "/assets/levels/"
-    for f in os.listdir(path):
-        TOTAL_LEVELS_LOADED += 1
-    TOTAL_LEVELS_LOADED /= 2
-    TOTAL_LEVELS_LOADED = int(TOTAL_LEVELS_LOADED)
+def cache_level_image(level_data):
+    "Converts a level's prefetched image, and makes it the image Layer uses for that level."
+    key = (level_data.category, level_data.index)
+    LEVEL_IMAGE_CACHE[key] = level_data.image.convert_alpha()
+    LEVEL_IMAGE_CACHE.move_to_end(key)
+    while len(LEVEL_IMAGE_CACHE) > LEVEL_IMAGE_CACHE_CAPACITY:
+        LEVEL_IMAGE_CACHE.popitem(last=False)
+    level_data.image = None
 
-    for i in range(TOTAL_LEVELS_LOADED):
-        LAYER_LOOKUP.append(pygame.image.load(
-            path + str(i) + ".png").convert_alpha())
 
-    # Load boses
-    path = os.path.dirname(os.path.abspath(__file__)) + "/assets/bosses/"
-    for f in os.listdir(path):
-        TOTAL_BOSSES_LOADED += 1
-    TOTAL_BOSSES_LOADED /= 2
-    TOTAL_BOSSES_LOADED = int(TOTAL_BOSSES_LOADED)
+def get_frames(sheet, x, y, width, height):
+    "Returns the flip variants of a region of a sprite sheet, indexed by flipped_horizontally + flipped_vertically * 2."
+    key = (sheet, x, y, width, height)
+    frames = FRAME_CACHE.get(key)
+    if frames is None:
+        frame = pygame.Surface((width, height), pygame.SRCALPHA).convert_alpha()
+        frame.blit(sheet, (0, 0), (x, y, width, height))
+        frames = [frame, None, None, None]
+        FRAME_CACHE[key] = frames
+    return frames
 
-    for i in range(TOTAL_BOSSES_LOADED):
-        BOSS_LOOKUP.append(pygame.image.load(
-            path + str(i) + ".png").convert_alpha())            
 
-    # Load Extra backgrounds
-    path = os.path.dirname(os.path.abspath(__file__)) + \
-        "/assets/sprites/layers/"
-    for f in os.listdir(path):
-        LAYER_LOOKUP.append(pygame.image.load(path + str(f)).convert())
+def get_frame(sheet, x, y, width, height, flipped_horizontally=False, flipped_vertically=False):
+    "Returns a shared surface of the given region of a sprite sheet. Treat the result as read-only."
+    frames = get_frames(sheet, x, y, width, height)
+    index = int(flipped_horizontally) + int(flipped_vertically) * 2
+    if frames[index] is None:
+        frames[index] = pygame.transform.flip(
+            frames[0], flipped_horizontally, flipped_vertically).convert_alpha()
+    return frames[index]
+
+
+def precache_frames():
+    "Cuts and flips the frames of sprites that change direction constantly, so it never happens mid-game."
+    Sprite(0, 0, SpriteType.PLAYER).precache_frames(11, 6)
+    Sprite(0, 0, SpriteType.CRAB).precache_frames(8, 4)
+    Sprite(0, 0, SpriteType.CRAB_BOSS_ARM).precache_frames(1, 1)
+
+
+def load_glyphs():
+    "Cuts every character out of the font sheet once."
+    columns = TEXT_SHEET.get_width() // GLYPH_SIZE
+    rows = TEXT_SHEET.get_height() // GLYPH_SIZE
+
+    del GLYPHS[:]
+    for i in range(columns * rows):
+        GLYPHS.append(get_frame(
+            TEXT_SHEET,
+            i % columns * GLYPH_SIZE,
+            i // columns * GLYPH_SIZE,
+            GLYPH_SIZE,
+            GLYPH_SIZE
+        ))
+    TEXT_CACHE.clear()
+
+
+def render_text(value):
+    "Returns a shared surface with value written on it using the font sheet. Treat the result as read-only."
+    image = TEXT_CACHE.get(value)
+    if image is not None:
+        TEXT_CACHE.move_to_end(value)
+        return image
+
+    image = pygame.Surface(
+        (len(value) * GLYPH_SIZE, GLYPH_SIZE), pygame.SRCALPHA).convert_alpha()
+    for i in range(len(value)):
+        character = ord(value[i])
+        if character < len(GLYPHS):
+            image.blit(GLYPHS[character], (i * GLYPH_SIZE, 0))
+
+    TEXT_CACHE[value] = image
+    if len(TEXT_CACHE) > TEXT_CACHE_CAPACITY:
+        TEXT_CACHE.popitem(last=False)
+
+    return image
 
 
 class SpriteType(IntEnum):
@@ -108,6 +257,11 @@ class SpriteType(IntEnum):
 
 
 class Sprite(PygineObject):
+    __slots__ = (
+        "part_of_boss", "is_title", "type", "image", "__sprite_x", "__sprite_y", "__original_sprite_x",
+        "__original_sprite_y", "__flipped_horizontally", "__flipped_vertically", "__frames"
+    )
+
     def __init__(self, x, y, sprite_type=SpriteType.NONE):
         super(Sprite, self).__init__(x, y, 0, 0)
         self.part_of_boss = False
@@ -134,19 +288,13 @@ class Sprite(PygineObject):
 
     def flip_horizontally(self, flip):
         if flip:
-            self.image = pygame.transform.flip(
-                self.image, True, False).convert_alpha()
-        else:
-            self.image = pygame.transform.flip(
-                self.image, False, False).convert_alpha()
+            self.__flipped_horizontally = not self.__flipped_horizontally
+            self.__update_image()
 
     def flip_vertically(self, flip):
         if flip:
-            self.image = pygame.transform.flip(
-                self.image, False, True).convert_alpha()
-        else:
-            self.image = pygame.transform.flip(
-                self.image, False, False).convert_alpha()
+            self.__flipped_vertically = not self.__flipped_vertically
+            self.__update_image()
 
     def __sprite_setup(self, sprite_x=0, sprite_y=0, width=0, height=0):
         self.__original_sprite_x = sprite_x
@@ -228,23 +376,56 @@ class Sprite(PygineObject):
 
         self.__apply_changes_to_sprite()
 
-    def __apply_changes_to_sprite(self):
-        self.image = pygame.Surface(
-            (self.width, self.height), pygame.SRCALPHA).convert_alpha()
-
+    def precache_frames(self, total_frames, columns):
+        for frame in range(total_frames):
+            self.set_frame(frame, columns)
+            for flipped_vertically in (False, True):
+                for flipped_horizontally in (False, True):
+                    get_frame(
+                        self.__get_sheet(),
+                        self.__sprite_x,
+                        self.__sprite_y,
+                        self.width,
+                        self.height,
+                        flipped_horizontally,
+                        flipped_vertically
+                    )
+        self.set_frame(0, columns)
+
+    def __get_sheet(self):
         if self.type == SpriteType.TEXT:
-            self.image.blit(TEXT_SHEET, (0, 0),
-                            (self.__sprite_x, self.__sprite_y, self.width, self.height))
-        else:
-            if self.is_title:
-                self.image.blit(HELP_SHEET, (0, 0),
-                                (self.__sprite_x, self.__sprite_y, self.width, self.height))
-            elif not self.part_of_boss:
-                self.image.blit(SPRITE_SHEET, (0, 0),
-                                (self.__sprite_x, self.__sprite_y, self.width, self.height))
-            elif self.part_of_boss:
-                self.image.blit(BOSS_SHEET, (0, 0),
-                                (self.__sprite_x, self.__sprite_y, self.width, self.height))
+            return TEXT_SHEET
+        if self.is_title:
+            return HELP_SHEET
+        if self.part_of_boss:
+            return BOSS_SHEET
+        return SPRITE_SHEET
+
+    def __update_image(self):
+        self.image = self.__frames[int(self.__flipped_horizontally) +
+                                   int(self.__flipped_vertically) * 2]
+        if self.image is None:
+            self.image = get_frame(
+                self.__get_sheet(),
+                self.__sprite_x,
+                self.__sprite_y,
+                self.width,
+                self.height,
+                self.__flipped_horizontally,
+                self.__flipped_vertically
+            )
+
+    def __apply_changes_to_sprite(self):
+        self.__flipped_horizontally = False
+        self.__flipped_vertically = False
+        self.__frames = get_frames(
+            self.__get_sheet(),
+            self.__sprite_x,
+            self.__sprite_y,
+            self.width,
+            self.height
+        )
+        self.image = self.__frames[0]
 
     def draw(self, surface, camera_type):
         draw_image(surface, self.image, self.bounds, camera_type)
@@ -270,27 +451,22 @@ class Animation:
 
 class Text(PygineObject):
     def __init__(self, x, y, value):
-        super(Text, self).__init__(x, y, 8, 8)
+        super(Text, self).__init__(x, y, GLYPH_SIZE, GLYPH_SIZE)
 
-        self.value = value
-        self.set_value(self.value)
+        self.value = None
+        self.image = None
+        self.set_value(value)
 
     def set_value(self, value):
-        self.value = value
-
-        self.sprites = []
-        for i in range(len(self.value)):
-            self.sprites.append(
-                Sprite(self.x + i * self.width, self.y, SpriteType.TEXT))
+        if value == self.value:
+            return
 
-        for i in range(len(self.value)):
-            self.sprites[i].set_frame(ord(list(self.value)[i]), 16)
-
-        self.sprites.sort(key=lambda e: -e.x)
+        self.value = value
+        self.image = render_text(self.value)
+        self.set_width(self.image.get_width())
 
     def draw(self, surface, camera_type):
-        for s in self.sprites:
-            s.draw(surface, camera_type)
+        draw_image(surface, self.image, self.bounds, camera_type)
 
 
 class Layer(PygineObject):
@@ -305,36 +481,19 @@ class Layer(PygineObject):
             self.set_width(20 * 16)
             self.set_height(15 * 16)
         
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-
         if is_level and not is_boss:
-            self.image = self.image.convert_alpha()            
-            self.image.blit(
-                LAYER_LOOKUP[int(self.index)], (0, 0), (0, 0, self.width, self.height))
-
+            self.image = load_layer_image("levels", int(self.index))
         elif is_level and is_boss:
-            self.image = self.image.convert_alpha()            
-            self.image.blit(
-                BOSS_LOOKUP[int(self.index)], (0, 0), (0, 0, self.width, self.height))
-            
+            self.image = load_layer_image("bosses", int(self.index))
         else:
-            self.image = self.image.convert()
-            if str(os.path.dirname(os.path.abspath(__file__)))[:9] == "/home/cpi":
-                panic = 0
-                if self.index == 0:
-                    panic = 1
-
-                self.image.blit(
-                    LAYER_LOOKUP[TOTAL_LEVELS_LOADED + panic],
-                    (0, 0),
-                    (0, 0, self.width, self.height)
-                )          
-            else:
-                self.image.blit(
-                    LAYER_LOOKUP[TOTAL_LEVELS_LOADED + self.index],
-                    (0, 0),
-                    (0, 0, self.width, self.height)
-                )     
+            self.image = load_layer_image("layers", int(self.index))
+
+        # The cached image is shared, so only make a copy if it needs to be cropped or padded.
+        if self.image.get_width() != self.width or self.image.get_height() != self.height:
+            image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+            image = image.convert_alpha() if is_level else image.convert()
+            image.blit(self.image, (0, 0), (0, 0, self.width, self.height))
+            self.image = image
 
     def draw(self, surface, camera_type):
         draw_image(surface, self.image, self.bounds, camera_type)
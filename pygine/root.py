@@ -1,10 +1,14 @@
 import math
 import os
 import pygame
+from pygine.draw import begin_display_list, calculate_dirty_rectangles, clear_scaled_image_cache, end_display_list, \
+    replay_display_list
 from pygine.globals import toggle_debugging
 from pygine.input import get_dynamic_mouse_position, InputType, pressed, update_input
+from pygine.profiler import PERCENTILES, profiler
 from pygine.resource import load_content, Text
 from pygine.scenes import *
+from pygine.tracer import tracer
 from pygine.utilities import Color, StaticCamera
 from enum import IntEnum
 
@@ -19,11 +23,33 @@ class Orientaion(IntEnum):
     PORTRAIT = 1
 
 
+class RenderMode(IntEnum):
+    SCALED = 0
+    NATIVE_INTEGER = 1
+    NATIVE_SMOOTH = 2
+
+
 class Game:
     "A modest game engine used to streamline the development of a game made using pygame"
     state = GameState.QUIT
-
-    def __init__(self):
+    MAXIMUM_DIRTY_RECTANGLES = 32
+    # How many frames the profiler overlay waits before it recalculates its percentiles.
+    PROFILER_OVERLAY_INTERVAL = 30
+
+    def __init__(self, render_mode=RenderMode.SCALED, dirty_rectangles=False, fixed_timestep=False, tick_rate=60,
+                 maximum_catch_up_steps=5, headless=False, profile_path=None, trace_path=None):
+        # Tracing starts right away, so loading the game's content shows up in the trace too.
+        self.trace_path = trace_path
+        if self.trace_path != None:
+            tracer.start()
+
+        self.render_mode = render_mode
+        self.dirty_rectangles = dirty_rectangles
+        # A headless game is simulated as fast as possible, exactly one tick per frame, so it always plays out the same.
+        self.headless = headless
+        self.fixed_timestep = fixed_timestep or self.headless
+        self.tick_rate = tick_rate
+        self.maximum_catch_up_steps = maximum_catch_up_steps
         self.__initialize_pygame()
 
         self.__setup_window(
@@ -42,11 +68,20 @@ class Game:
         self.clock = pygame.time.Clock()
         self.delta_time = 0
         self.ticks = 0
+        self.accumulator = 0
+        self.interpolation = 1
         self.scene_manager = SceneManager()
 
         self.no_spam = False
         self.fps_counter = Text(2, 2, "0")
 
+        # The profiler runs while the debug overlay is up, or the whole time if its results are written to a file.
+        self.profile_path = profile_path
+        if self.profile_path != None:
+            profiler.record()
+        self.profiler_overlay = []
+        self.profiler_overlay_frames = 0
+
     def __initialize_pygame(self):
         pygame.mixer.pre_init(22050, -16, 2, 512)
         pygame.mixer.init()
@@ -67,6 +102,7 @@ class Game:
             self.window_width = 320
             self.window_height = 240
             self.target_fps = 60
+            self.dirty_rectangles = True
 
         if self.fullscreen:
             self.window = pygame.display.set_mode(
@@ -82,6 +118,9 @@ class Game:
         self.game_height = game_height
 
     def __setup_cameras(self):
+        # Forces the next frame to be redrawn completely when using dirty rectangles.
+        self.display_list = None
+
         if self.orientation == Orientaion.LANDSCAPE:
             if self.fullscreen:
                 self.scale = self.display_height / self.game_height
@@ -102,6 +141,14 @@ class Game:
                 if self.game_height * self.scale > self.window_height:
                     self.scale = self.window_height / self.game_height
 
+        if self.render_mode != RenderMode.SCALED:
+            # Scenes draw into a back buffer at scale 1, and the finished frame is upscaled once in __present_back_buffer().
+            self.static_camera = StaticCamera(
+                (self.game_width, self.game_height), 1)
+            self.__setup_back_buffer()
+            clear_scaled_image_cache()
+            return
+
         self.static_camera = StaticCamera(
             (self.game_width, self.game_height), self.scale)
 
@@ -120,6 +167,55 @@ class Game:
                 self.static_camera.apply_vertical_letterbox(
                     (self.window_height - self.game_height * self.scale) / 2)
 
+        clear_scaled_image_cache()
+
+    def __setup_back_buffer(self):
+        window_width, window_height = self.window.get_size()
+
+        if self.render_mode == RenderMode.NATIVE_INTEGER:
+            present_scale = max(1, int(self.scale))
+        else:
+            present_scale = self.scale
+
+        present_width = int(self.game_width * present_scale)
+        present_height = int(self.game_height * present_scale)
+        self.present_bounds = pygame.Rect(
+            (window_width - present_width) // 2,
+            (window_height - present_height) // 2,
+            present_width,
+            present_height
+        )
+
+        self.back_buffer = pygame.Surface(
+            (self.game_width, self.game_height)).convert()
+        self.present_surface = self.window.subsurface(self.present_bounds)
+
+        self.letterboxes = [
+            # Top
+            pygame.Rect(0, 0, window_width, self.present_bounds.top),
+            # Bottom
+            pygame.Rect(0, self.present_bounds.bottom, window_width,
+                        window_height - self.present_bounds.bottom),
+            # Left
+            pygame.Rect(0, self.present_bounds.top,
+                        self.present_bounds.left, present_height),
+            # Right
+            pygame.Rect(self.present_bounds.right, self.present_bounds.top,
+                        window_width - self.present_bounds.right, present_height)
+        ]
+
+    def __present_back_buffer(self):
+        if self.render_mode == RenderMode.NATIVE_SMOOTH:
+            pygame.transform.smoothscale(
+                self.back_buffer, self.present_bounds.size, self.present_surface)
+        else:
+            pygame.transform.scale(
+                self.back_buffer, self.present_bounds.size, self.present_surface)
+
+        for letterbox in self.letterboxes:
+            if letterbox.width > 0 and letterbox.height > 0:
+                self.window.fill(Color.BLACK, letterbox)
+
     def __quit_game(self):
         Game.state = GameState.QUIT
 
@@ -135,6 +231,10 @@ class Game:
         self.__setup_cameras()
 
     def __calculate_delta_time(self):
+        if self.headless:
+            self.delta_time = 1.0 / self.tick_rate
+            return
+
         self.clock.tick(self.target_fps)
         self.fps_counter.set_value(str(int(math.ceil(self.clock.get_fps()))))
         self.delta_time = (pygame.time.get_ticks() - self.ticks) / 1000.0
@@ -160,31 +260,178 @@ class Game:
             if event.type == pygame.QUIT:
                 self.__quit_game()
 
-    def __clear_screen(self, color=Color.BLACK):
+    def __clear_screen(self, surface, color=Color.BLACK):
         "Clear the screen in preparation for the next draw call."
-        self.window.fill(color)
+        surface.fill(color)
+
+    def __get_viewport(self):
+        if self.render_mode == RenderMode.SCALED:
+            return pygame.Rect(
+                StaticCamera.horizontal_letterbox,
+                StaticCamera.vertical_letterbox,
+                self.game_width * self.scale,
+                self.game_height * self.scale
+            )
+        return self.back_buffer.get_rect()
+
+    def __redraw_dirty_rectangles(self, surface, display_list, color):
+        "Only redraws the parts of the screen that changed since the last frame. Returns None if everything was redrawn."
+        viewport = self.__get_viewport()
+
+        dirty_rectangles = None
+        if self.display_list != None:
+            dirty_rectangles = []
+            dirty_area = 0
+            for r in calculate_dirty_rectangles(self.display_list, display_list):
+                r = r.clip(viewport)
+                if r.width > 0 and r.height > 0:
+                    dirty_rectangles.append(r)
+                    dirty_area += r.width * r.height
+
+            if (
+                len(dirty_rectangles) > Game.MAXIMUM_DIRTY_RECTANGLES or
+                dirty_area > viewport.width * viewport.height / 2
+            ):
+                dirty_rectangles = None
+
+        self.display_list = display_list
+
+        for r in dirty_rectangles if dirty_rectangles != None else [viewport]:
+            surface.set_clip(r)
+            self.__clear_screen(surface, color)
+            replay_display_list(surface, display_list, r)
+        surface.set_clip(None)
+
+        return dirty_rectangles
+
+    def __update_fixed_timestep(self):
+        "Advances the simulation in steps of exactly 1 / tick_rate seconds, no matter how long the last frame took."
+        step = 1.0 / self.tick_rate
+        self.accumulator += self.delta_time
+
+        steps = 0
+        while self.accumulator >= step and steps < self.maximum_catch_up_steps:
+            self.scene_manager.save_interpolation_state()
+            profiler.begin("input")
+            self.__update_input(step)
+            profiler.end("input")
+            profiler.begin("update")
+            self.scene_manager.update(step)
+            profiler.end("update")
+            self.accumulator -= step
+            steps += 1
+
+        # If the simulation cannot keep up, the steps it fell behind on are dropped instead of piling up forever.
+        if self.accumulator >= step:
+            self.accumulator %= step
+
+        self.interpolation = self.accumulator / step
 
     def __update(self):
+        profiler.enabled = globals.debugging or self.profile_path != None
+        profiler.begin_frame()
+        tracer.begin("frame", "frame")
+
+        profiler.begin("wait")
         self.__calculate_delta_time()
-        self.__update_input(self.delta_time)
-        self.scene_manager.update(self.delta_time)
+        profiler.end("wait")
+        if self.fixed_timestep:
+            self.__update_fixed_timestep()
+        else:
+            profiler.begin("input")
+            self.__update_input(self.delta_time)
+            profiler.end("input")
+            profiler.begin("update")
+            self.scene_manager.update(self.delta_time)
+            profiler.end("update")
         self.__update_events()
 
+    def __update_profiler_overlay(self):
+        self.profiler_overlay_frames -= 1
+        if self.profiler_overlay_frames > 0 and len(self.profiler_overlay) > 0:
+            return
+        self.profiler_overlay_frames = Game.PROFILER_OVERLAY_INTERVAL
+
+        lines = ["{:<12}".format("ms") + "".join("{:>6}".format("p" + str(p)) for p in PERCENTILES)]
+        for phase, percentiles, maximum in profiler.summarize():
+            lines.append("{:<12}".format(phase) + "".join("{:>6.2f}".format(v) for v in percentiles))
+
+        while len(self.profiler_overlay) < len(lines):
+            self.profiler_overlay.append(Text(2, 12 + len(self.profiler_overlay) * 9, ""))
+        del self.profiler_overlay[len(lines):]
+        for i in range(len(lines)):
+            self.profiler_overlay[i].set_value(lines[i])
+
     def __draw(self):
-        if Game.state == GameState.QUIT:
-            self.__clear_screen(Color.BLACK)
+        if self.render_mode == RenderMode.SCALED:
+            surface = self.window
         else:
-            self.__clear_screen(Color.SKY_BLUE)
-            self.scene_manager.draw(self.window)
+            surface = self.back_buffer
+
+        color = Color.BLACK if Game.state == GameState.QUIT else Color.SKY_BLUE
+
+        if self.dirty_rectangles:
+            begin_display_list()
+        else:
+            self.__clear_screen(surface, color)
+
+        profiler.begin("draw scene")
+        if Game.state != GameState.QUIT:
+            if self.fixed_timestep:
+                self.scene_manager.draw(surface, self.interpolation)
+            else:
+                self.scene_manager.draw(surface)
+        profiler.end("draw scene")
 
         if globals.debugging:
-            self.fps_counter.draw(self.window, CameraType.STATIC)
+            profiler.begin("draw overlay")
+            self.fps_counter.draw(surface, CameraType.STATIC)
+            self.__update_profiler_overlay()
+            for text in self.profiler_overlay:
+                text.draw(surface, CameraType.STATIC)
+            profiler.end("draw overlay")
         #self.fps_counter.draw(self.window, CameraType.STATIC)
-        self.static_camera.draw(self.window)
-        pygame.display.update()
 
-    def run(self):
-        while Game.state != GameState.QUIT:
+        dirty_rectangles = None
+        if self.dirty_rectangles:
+            profiler.begin("draw dirty")
+            dirty_rectangles = self.__redraw_dirty_rectangles(
+                surface, end_display_list(), color)
+            profiler.end("draw dirty")
+
+        profiler.begin("present")
+        if self.render_mode == RenderMode.SCALED:
+            self.static_camera.draw(self.window)
+        else:
+            self.__present_back_buffer()
+        profiler.end("present")
+
+        profiler.begin("display")
+        if self.render_mode == RenderMode.SCALED and dirty_rectangles != None:
+            if len(dirty_rectangles) > 0:
+                pygame.display.update(dirty_rectangles)
+        else:
+            pygame.display.update()
+        profiler.end("display")
+
+        profiler.end_frame()
+        tracer.end("frame", "frame")
+
+    def run(self, frames=None, draw=True):
+        "Runs the game until it quits, or until the given number of frames have been played."
+        frame = 0
+        while Game.state != GameState.QUIT and (frames is None or frame < frames):
             self.__update()
-            self.__draw()
+            if draw:
+                self.__draw()
+            else:
+                profiler.end_frame()
+                tracer.end("frame", "frame")
+            frame += 1
+
+        if self.profile_path != None:
+            profiler.write(self.profile_path)
+        if self.trace_path != None:
+            tracer.stop()
+            tracer.write(self.trace_path)
         pygame.quit()
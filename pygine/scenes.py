@@ -1,13 +1,13 @@
 from enum import IntEnum
-import json
-import os
 import pygame
 from pygame import Rect
 from pygine.entities import *
 from pygine.input import InputType, pressed
 from pygine.maths import Vector2
-from pygine.resource import Layer
-from pygine.structures import Quadtree, Bin
+from pygine.profiler import profiler
+from pygine.tracer import tracer
+from pygine.resource import cache_level_image, get_manifest, Layer, load_level_data, prefetch_level_data, TileType
+from pygine.structures import CollisionMap, EntityRegistry, KineticGrid, Quadtree, SpatialHash, SweepAndPrune
 from pygine.sounds import play_song
 from pygine.transitions import Cage, Pinhole, Slide, TransitionType
 from pygine.triggers import OnButtonPressTrigger
@@ -112,9 +112,14 @@ class SceneManager:
         assert (self.__current_scene != None), \
             "It looks like you never set a starting scene! Make sure to call __set_starting_scene(starting_scene_type)"
 
+        tracer.begin("SceneManager.update", "update", type(self.__current_scene).__name__)
         self.__update_input(delta_time)
         self.__update_transition(delta_time)
         self.__current_scene.update(delta_time)
+        tracer.end("SceneManager.update", "update")
+
+    def save_interpolation_state(self):
+        self.__current_scene.save_interpolation_state()
 
     def __draw_transitions(self, surface):
         if self.start_transition:
@@ -125,36 +130,52 @@ class SceneManager:
             else:
                 self.enter_transition.draw(surface)
 
-    def draw(self, surface):
+    def draw(self, surface, interpolation=None):
         assert (self.__current_scene != None), \
             "It looks like you never set a starting scene! Make sure to call __set_starting_scene(starting_scene_type)"
 
-        self.__current_scene.draw(surface)
+        tracer.begin("Scene.draw", "draw", type(self.__current_scene).__name__)
+        if interpolation is None:
+            self.__current_scene.draw(surface)
+        else:
+            self.__current_scene.draw_interpolated(surface, interpolation)
+        tracer.end("Scene.draw", "draw")
+        tracer.begin("SceneManager.__draw_transitions", "draw")
         self.__draw_transitions(surface)
+        tracer.end("SceneManager.__draw_transitions", "draw")
 
 
 class SceneDataRelay(object):
     def __init__(self):
         self.scene_bounds = None
         self.entities = None
-        self.entity_quad_tree = None
-        self.entity_bin = None
-        self.kinetic_quad_tree = None
+        self.entity_index = None
+        self.kinetic_grid = None
+        self.collision_map = None
+        self.broadphase = None
+        self.registry = None
         self.actor = None
 
     def set_scene_bounds(self, bounds):
         self.scene_bounds = bounds
 
-    def update(self, entites, entity_quad_tree, entity_bin, kinetic_quad_tree, actor):
+    def update(self, entites, entity_index, kinetic_grid, collision_map, broadphase, registry, actor):
         self.entities = entites
-        self.entity_quad_tree = entity_quad_tree
-        self.entity_bin = entity_bin
-        self.kinetic_quad_tree = kinetic_quad_tree
+        self.entity_index = entity_index
+        self.kinetic_grid = kinetic_grid
+        self.collision_map = collision_map
+        self.broadphase = broadphase
+        self.registry = registry
         self.actor = actor
 
 
 class Scene(object):
     VIEWPORT_BUFFER = 32
+    KINETIC_GRID_POWER_OF_TWO = 5
+    TILE_POWER_OF_TWO = 4
+    BROADPHASE_MARGIN = 16
+    # Anything that moved further than this in a single update was teleported, and is not interpolated.
+    INTERPOLATION_LIMIT = 32
 
     def __init__(self):
         self.scene_bounds = Rect(
@@ -182,13 +203,20 @@ class Scene(object):
 
         self.sprite_quad_tree = Quadtree(self.scene_bounds, 4)
         self.shape_quad_tree = Quadtree(self.scene_bounds, 4)
-        self.entity_quad_tree = Quadtree(self.scene_bounds, 4)
-        self.kinetic_quad_tree = Quadtree(self.scene_bounds, 4)
-        self.entity_bin = Bin(self.scene_bounds, 4)
-        self.query_result = None
+        self.entity_index = Quadtree(self.scene_bounds, 4)
+        self.kinetic_grid = KineticGrid(
+            self.scene_bounds, Scene.KINETIC_GRID_POWER_OF_TWO)
+        self.kinetic_grid_updates = 0
+        self.collision_map = CollisionMap(
+            self.scene_bounds, Scene.TILE_POWER_OF_TWO)
+        self.broadphase = None
+        self.registry = EntityRegistry()
+        self.previous_locations = {}
+        self.previous_camera = None
+        self.query_result = []
         self.first_pass = True
         self.entities_are_uniform = False
-        self.optimal_bin_size = 0
+        self.optimal_cell_power_of_two = 0
 
         self.leave_transition_type = TransitionType.PINHOLE_CLOSE
         self.enter_transition_type = TransitionType.PINHOLE_OPEN
@@ -198,11 +226,14 @@ class Scene(object):
         self.scene_data = SceneDataRelay()
         self.scene_data.set_scene_bounds(self.scene_bounds)
 
-    def setup(self, entities_are_uniform, maximum_entity_dimension=0):
+    def setup(self, entities_are_uniform, maximum_entity_dimension=0, sweep_and_prune=False):
         self.entities_are_uniform = entities_are_uniform
         if self.entities_are_uniform:
-            self.optimal_bin_size = int(
+            self.optimal_cell_power_of_two = int(
                 math.ceil(math.log(maximum_entity_dimension, 2)))
+        # With a broadphase, kinetic entities find each other through one list of pairs per frame instead of each querying the kinetic grid.
+        if sweep_and_prune:
+            self.broadphase = SweepAndPrune(Scene.BROADPHASE_MARGIN)
 
         self._reset()
         self._create_triggers()
@@ -221,10 +252,17 @@ class Scene(object):
 
         self.sprite_quad_tree = Quadtree(modified_bounds, 4)
         self.shape_quad_tree = Quadtree(modified_bounds, 4)
-        self.entity_quad_tree = Quadtree(modified_bounds, 4)
-        self.kinetic_quad_tree = Quadtree(self.scene_bounds, 4)
+        # A spatial hash beats the quadtree when every entity is about the same size.
         if self.entities_are_uniform:
-            self.entity_bin = Bin(modified_bounds, self.optimal_bin_size)
+            self.entity_index = SpatialHash(
+                modified_bounds, self.optimal_cell_power_of_two)
+        else:
+            self.entity_index = Quadtree(modified_bounds, 4)
+        self.kinetic_grid.clear()
+        self.kinetic_grid = KineticGrid(
+            self.scene_bounds, Scene.KINETIC_GRID_POWER_OF_TWO)
+        self.collision_map = CollisionMap(
+            self.scene_bounds, Scene.TILE_POWER_OF_TWO)
         self.first_pass = True
 
     def relay_actor(self, actor):
@@ -236,6 +274,22 @@ class Scene(object):
         self.entities.append(entity)
         # We can potentially add aditional logic for certain entites. For example, if the entity is a NPC then spawn it at (x, y)
 
+    def _spawn_level(self, level_data):
+        # Solid geometry never changes, so it goes into the collision map instead of becoming entities.
+        solids = []
+        for tile, x, y, width, height in level_data.spawns:
+            if tile == TileType.PLAYER:
+                self.actor.set_location(x, y)
+            elif tile == TileType.CRAB:
+                self.entities.append(Crab(x, y))
+            elif tile == TileType.Q_BLOCK_0:
+                self.entities.append(QBlock(x, y, 0))
+            elif tile == TileType.Q_BLOCK_1:
+                self.entities.append(QBlock(x, y, 1))
+            elif tile == TileType.BLOCK:
+                solids.append(Rect(x, y, width, height))
+        self.collision_map.build(solids)
+
     def _reset(self):
         raise NotImplementedError(
             "A class that inherits Scene did not implement the reset() method")
@@ -246,6 +300,7 @@ class Scene(object):
 
     def __update_spatial_partitioning(self):
         if self.first_pass:
+            tracer.begin("Scene.__update_spatial_partitioning", "partitioning", type(self).__name__)
             self.sprite_quad_tree.clear()
             for i in range(len(self.sprites)):
                 self.sprite_quad_tree.insert(self.sprites[i])
@@ -255,25 +310,59 @@ class Scene(object):
                 self.shape_quad_tree.insert(self.shapes[i])
             self.first_pass = False
 
-            self.entity_quad_tree.clear()
-            if self.entities_are_uniform:
-                self.entity_bin.clear()
+            self.entity_index.clear()
+            self.kinetic_grid.clear()
+            if self.broadphase != None:
+                self.broadphase.clear()
+            self.registry.clear()
             for i in range(len(self.entities)):
-                if not isinstance(self.entities[i], Kinetic):
-                    self.entity_quad_tree.insert(self.entities[i])
-                    if self.entities_are_uniform:
-                        self.entity_bin.insert(self.entities[i])
-
-        self.kinetic_quad_tree.clear()
-        for i in range(len(self.entities)):
-            if isinstance(self.entities[i], Kinetic):
-                self.kinetic_quad_tree.insert(self.entities[i])
+                self.registry.insert(self.entities[i])
+                if isinstance(self.entities[i], Kinetic):
+                    self.kinetic_grid.insert(self.entities[i])
+                    if self.broadphase != None:
+                        self.broadphase.insert(self.entities[i])
+                else:
+                    self.entity_index.insert(self.entities[i])
+            tracer.end("Scene.__update_spatial_partitioning", "partitioning")
+
+        # Kinetic entities keep the grid up to date themselves whenever they move.
+        self.kinetic_grid_updates = self.kinetic_grid.reset_updates()
+
+        if self.broadphase != None:
+            self.broadphase.update()
+
+    def __register_entity(self, entity):
+        self.registry.insert(entity)
+        if isinstance(entity, Kinetic):
+            self.kinetic_grid.insert(entity)
+            if self.broadphase != None:
+                self.broadphase.insert(entity)
+
+    def __remove_entity(self, i):
+        entity = self.entities[i]
+        self.registry.remove(entity)
+        if entity.spatial_index is self.kinetic_grid:
+            self.kinetic_grid.remove(entity)
+            if self.broadphase != None:
+                self.broadphase.remove(entity)
+        elif not isinstance(entity, Kinetic):
+            # Static entities are only indexed on the first pass, so the index has to be built again without this one.
+            self.first_pass = True
+        del self.entities[i]
+
+    def remove_entity(self, entity):
+        "Takes an entity out of this scene, along with every index that keeps track of it."
+        self.__remove_entity(self.entities.index(entity))
 
     def __update_entities(self, delta_time):
         for i in range(len(self.entities)-1, -1, -1):
+            # Entities that were added since the last first pass still need to be registered, and kinetic ones need to join the grid.
+            if not self.registry.contains(self.entities[i]):
+                self.__register_entity(self.entities[i])
+
             self.entities[i].update(delta_time, self.scene_data)
             if self.entities[i].remove:
-                del self.entities[i]
+                self.__remove_entity(i)
 
     def __update_triggers(self, delta_time):
         for t in self.triggers:
@@ -292,31 +381,86 @@ class Scene(object):
             self.camera.get_viewport_top_left().y - Scene.VIEWPORT_BUFFER)
 
     def update(self, delta_time):
+        profiler.begin("partitioning")
         self.__update_spatial_partitioning()
+        profiler.end("partitioning")
         self.scene_data.update(
             self.entities,
-            self.entity_quad_tree,
-            self.entity_bin,
-            self.kinetic_quad_tree,
+            self.entity_index,
+            self.kinetic_grid,
+            self.collision_map,
+            self.broadphase,
+            self.registry,
             self.actor
         )
+        profiler.begin("entities")
         self.__update_entities(delta_time)
+        profiler.end("entities")
+        profiler.begin("triggers")
         self.__update_triggers(delta_time)
+        profiler.end("triggers")
+        profiler.begin("camera")
         self.__update_camera()
+        profiler.end("camera")
+
+    def save_interpolation_state(self):
+        "Remembers where every kinetic entity and the camera are before the next update, so draw_interpolated() can blend between the two."
+        self.previous_locations.clear()
+        for e in self.entities:
+            if isinstance(e, Kinetic):
+                self.previous_locations[e] = (e.x, e.y)
+        self.previous_camera = (Camera.top_left.x, Camera.top_left.y)
+
+    def __interpolate(self, previous, current, alpha, limit):
+        if abs(current - previous) > limit:
+            return current
+        return previous + (current - previous) * alpha
+
+    def draw_interpolated(self, surface, alpha):
+        "Draws the scene as if it was alpha of the way from the previous update to the latest one."
+        # Only sprites are shifted, so the entities themselves, their bounds and the spatial indices never see a location the
+        # simulation did not produce. The debug view draws those bounds, and so keeps showing the latest update.
+        shifted = []
+        camera_x = Camera.top_left.x
+        camera_y = Camera.top_left.y
+        try:
+            for e in self.entities:
+                previous = self.previous_locations.get(e)
+                sprite = getattr(e, "sprite", None)
+                if previous is None or sprite is None:
+                    continue
+                offset_x = self.__interpolate(previous[0], e.x, alpha, Scene.INTERPOLATION_LIMIT) - e.x
+                offset_y = self.__interpolate(previous[1], e.y, alpha, Scene.INTERPOLATION_LIMIT) - e.y
+                if offset_x == 0 and offset_y == 0:
+                    continue
+                shifted.append((sprite, sprite.x, sprite.y))
+                sprite.set_location(sprite.x + offset_x, sprite.y + offset_y)
+
+            if self.previous_camera != None:
+                limit = Scene.INTERPOLATION_LIMIT * Camera.scale
+                Camera.top_left.x = self.__interpolate(self.previous_camera[0], camera_x, alpha, limit)
+                Camera.top_left.y = self.__interpolate(self.previous_camera[1], camera_y, alpha, limit)
+
+            self.draw(surface)
+        finally:
+            Camera.top_left.x = camera_x
+            Camera.top_left.y = camera_y
+            for sprite, x, y in shifted:
+                sprite.set_location(x, y)
 
     def draw(self, surface):
         self.query_result = self.shape_quad_tree.query(
-            self.camera_viewport.bounds)
+            self.camera_viewport.bounds, self.query_result)
         for s in self.query_result:
             s.draw(surface, CameraType.DYNAMIC)
 
         self.query_result = self.sprite_quad_tree.query(
-            self.camera_viewport.bounds)
+            self.camera_viewport.bounds, self.query_result)
         for s in self.query_result:
             s.draw(surface, CameraType.DYNAMIC)
 
-        self.query_result = self.entity_quad_tree.query(
-            self.camera_viewport.bounds)
+        self.query_result = self.entity_index.query(
+            self.camera_viewport.bounds, self.query_result)
 
         for e in self.query_result:
             e.draw(surface)
@@ -325,7 +469,8 @@ class Scene(object):
             self.actor.draw(surface)
 
         if globals.debugging:
-            self.entity_quad_tree.draw(surface)
+            self.collision_map.draw(surface)
+            self.entity_index.draw(surface)
             for t in self.triggers:
                 t.draw(surface, CameraType.DYNAMIC)
 
@@ -449,6 +594,11 @@ class Level(Scene):
 
         self.already_played = set()
 
+        self.level_data = None
+        self.next_level = -1
+        self.next_level_data = None
+        self.__prefetch_random_level()
+
         self.song = "lapidary.wav"
         self.transition = Slide()
         self.start_transition = False
@@ -465,7 +615,7 @@ class Level(Scene):
         self.spaghetti = False
         self.more_spaghetti = False
 
-        self.setup(False)
+        self.setup(False, sweep_and_prune=True)
 
     def _reset(self):
         self.set_scene_bounds(
@@ -485,85 +635,46 @@ class Level(Scene):
         self.triggers = []
 
     def __calculate_total_levels(self):
-        self.total_levels = 0
-        path = os.path.dirname(os.path.abspath(__file__)) + "/assets/levels/"
-        for f in os.listdir(path):
-            self.total_levels += 1
-        self.total_levels /= 2
-        self.total_levels = int(self.total_levels)
+        self.total_levels = len(get_manifest()["levels"])
         #print("Loaded " + str(self.total_levels) + " levels.")
 
-    def __load_random_level(self):                
+    def __prefetch_random_level(self):
         random_level = randint(0, self.total_levels - 1)
         while random_level == self.previous_level or random_level in self.already_played:
             random_level = randint(0, self.total_levels - 1)
 
+        self.next_level = random_level
+        self.next_level_data = prefetch_level_data("levels", random_level)
+
+    def __load_random_level(self):
+        random_level = self.next_level
+
         self.already_played.add(random_level)
         self.previous_level = random_level
+        tracer.begin("Level.__load_random_level", "load", random_level)
+        self.level_data = self.next_level_data.result()
+        cache_level_image(self.level_data)
         self.sprite_layer = Layer(random_level)
-        self.__load_level(random_level)        
+        self.__load_level()
+        tracer.end("Level.__load_random_level", "load")
+
+        # Start loading the level after this one while the player is busy with this one.
+        self.__prefetch_random_level()
 
     def __restart_level(self):
         self.entities = [
             self.actor
         ]
-        self.__load_level(self.previous_level)
+        self.__load_level()
         self.first_pass = True
 
         play_song(self.song)
 
-    def __load_level(self, level):
-        path = os.path.dirname(os.path.abspath(__file__))
-
+    def __load_level(self):
+        tracer.begin("Level.__load_level", "load")
         self.actor.transitioning = False
-
-        with open(path + "/assets/levels/" + str(level) + ".json") as json_file:
-            data = json.load(json_file)
-
-            for layer in data["layers"]:
-
-                if layer["name"] == "blocks":
-                    array = layer["data"]
-                    for i in range(len(array)):
-                        if array[i] == 36:
-                            self.actor.set_location(
-                                int(i % layer["width"]) * 16,
-                                int(i / layer["width"]) * 16
-                            )
-                        elif array[i] == 38:
-                            self.entities.append(
-                                Crab(
-                                    int(i % layer["width"]) * 16,
-                                    int(i / layer["width"]) * 16
-                                )
-                            )
-                        elif array[i] == 81:
-                            self.entities.append(
-                                QBlock(
-                                    int(i % layer["width"]) * 16,
-                                    int(i / layer["width"]) * 16,
-                                    0
-                                )
-                            )
-                        elif array[i] == 82:
-                            self.entities.append(
-                                QBlock(
-                                    int(i % layer["width"]) * 16,
-                                    int(i / layer["width"]) * 16,
-                                    1
-                                )
-                            )
-
-                if layer["name"] == "rectangles":
-                    for rectangle in layer["objects"]:
-                        self.entities.append(
-                            Block(
-                                int(rectangle["x"]),
-                                int(rectangle["y"]),
-                                int(rectangle["width"]),
-                                int(rectangle["height"])
-                            )
-                        )
+        self._spawn_level(self.level_data)
+        tracer.end("Level.__load_level", "load")
 
     def update(self, delta_time):
         super(Level, self).update(delta_time)
@@ -612,13 +723,13 @@ class Level(Scene):
             for t in self.triggers:
                 t.draw(surface, CameraType.DYNAMIC)
 
-        self.query_result = self.entity_quad_tree.query(
-            self.camera_viewport.bounds)
+        self.query_result = self.entity_index.query(
+            self.camera_viewport.bounds, self.query_result)
         for e in self.query_result:
             e.draw(surface)
 
-        self.query_result = self.kinetic_quad_tree.query(
-            self.camera_viewport.bounds)
+        self.query_result = self.kinetic_grid.query(
+            self.camera_viewport.bounds, self.query_result)
         for e in self.query_result:
             if not isinstance(e, Actor):
                 e.draw(surface)
@@ -629,7 +740,8 @@ class Level(Scene):
         self.transition.draw(surface)
 
         if globals.debugging:
-            self.entity_quad_tree.draw(surface)
+            self.collision_map.draw(surface)
+            self.entity_index.draw(surface)
             for t in self.triggers:
                 t.draw(surface, CameraType.DYNAMIC)
 
@@ -654,6 +766,7 @@ class Boss(Scene):
         ]
 
         self.sprite_layer = None    
+        self.level_data = None
 
         self.closing_transition = Cage(TransitionType.CAGE_CLOSE)
 
@@ -683,57 +796,14 @@ class Boss(Scene):
         self.triggers = []
 
     def __load_level(self, level):
-        self.sprite_layer = Layer(level, True, True)        
+        tracer.begin("Boss.__load_level", "load", level)
+        if self.level_data == None or self.level_data.index != level:
+            self.level_data = load_level_data("bosses", level)
+            cache_level_image(self.level_data)
 
-        path = os.path.dirname(os.path.abspath(__file__))
-
-        with open(path + "/assets/bosses/" + str(level) + ".json") as json_file:
-            data = json.load(json_file)
-
-            for layer in data["layers"]:
-
-                if layer["name"] == "blocks":
-                    array = layer["data"]
-                    for i in range(len(array)):
-                        if array[i] == 36:
-                            self.actor.set_location(
-                                int(i % layer["width"]) * 16,
-                                int(i / layer["width"]) * 16
-                            )
-                        elif array[i] == 38:
-                            self.entities.append(
-                                Crab(
-                                    int(i % layer["width"]) * 16,
-                                    int(i / layer["width"]) * 16
-                                )
-                            )
-                        elif array[i] == 81:
-                            self.entities.append(
-                                QBlock(
-                                    int(i % layer["width"]) * 16,
-                                    int(i / layer["width"]) * 16,
-                                    0
-                                )
-                            )
-                        elif array[i] == 82:
-                            self.entities.append(
-                                QBlock(
-                                    int(i % layer["width"]) * 16,
-                                    int(i / layer["width"]) * 16,
-                                    1
-                                )
-                            )
-
-                if layer["name"] == "rectangles":
-                    for rectangle in layer["objects"]:
-                        self.entities.append(
-                            Block(
-                                int(rectangle["x"]),
-                                int(rectangle["y"]),
-                                int(rectangle["width"]),
-                                int(rectangle["height"])
-                            )
-                        )
+        self.sprite_layer = Layer(level, True, True)        
+        self._spawn_level(self.level_data)
+        tracer.end("Boss.__load_level", "load")
 
     def __restart_level(self):        
         self.boss = BossCrab()    
@@ -835,11 +905,12 @@ class Boss(Scene):
         self.sprite_layer.draw(surface, CameraType.DYNAMIC)
 
         if globals.debugging:
+            self.collision_map.draw(surface)
             for t in self.triggers:
                 t.draw(surface, CameraType.DYNAMIC)
 
-        self.query_result = self.entity_quad_tree.query(
-            self.camera_viewport.bounds)
+        self.query_result = self.entity_index.query(
+            self.camera_viewport.bounds, self.query_result)
         for e in self.query_result:
             e.draw(surface)
             
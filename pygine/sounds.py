@@ -1,11 +1,24 @@
 import os
 import pygame
 from pygame.mixer import Sound, music
+from pygine.tracer import tracer
 
 MUSIC_PATH = ""
 SOUND_PATH = ""
 current_song = ""
 
+TOTAL_CHANNELS = 16
+DEFAULT_CONCURRENCY_LIMIT = 2
+CONCURRENCY_LIMITS = {
+    "jump.wav": 1,
+    "shift.wav": 1,
+    "shift_fail.wav": 1,
+    "bop.wav": 3,
+}
+
+SOUND_CACHE = {}
+SOUND_CHANNELS = {}
+
 
 def load_sound_paths():
     global MUSIC_PATH
@@ -17,18 +30,58 @@ def load_sound_paths():
     SOUND_PATH = path + '/assets/sounds/'
 
 
+def load_sounds():
+    "Decodes every sound effect up front so nothing is read from disk while the game is running."
+    pygame.mixer.set_num_channels(TOTAL_CHANNELS)
+
+    SOUND_CACHE.clear()
+    SOUND_CHANNELS.clear()
+    for f in os.listdir(SOUND_PATH):
+        if f.endswith(".wav"):
+            get_sound(f)
+
+
+def get_sound(filename):
+    sound = SOUND_CACHE.get(filename)
+    if sound is None:
+        sound = Sound(SOUND_PATH + filename)
+        SOUND_CACHE[filename] = sound
+    return sound
+
+
 def play_song(filename, volume=0.75):
     global current_song
     global MUSIC_PATH
     if filename != current_song:
+        tracer.begin("play_song", "sound", filename)
         music.load(MUSIC_PATH + filename)
         music.set_volume(volume)
         music.play(-1)
         current_song = filename
+        tracer.end("play_song", "sound")
 
 
 def play_sound(filename, volume=0.75):
-    global SOUND_PATH
-    sound = Sound(SOUND_PATH + filename)    
-    sound.set_volume(volume)
-    sound.play()
+    tracer.begin("play_sound", "sound", filename)
+    __play_sound(filename, volume)
+    tracer.end("play_sound", "sound")
+
+
+def __play_sound(filename, volume):
+    sound = get_sound(filename)
+
+    # Forget about channels that finished playing this sound, or have since been reused by another sound.
+    channels = SOUND_CHANNELS.setdefault(filename, [])
+    channels[:] = [c for c in channels if c.get_busy() and c.get_sound() is sound]
+
+    if len(channels) >= CONCURRENCY_LIMITS.get(filename, DEFAULT_CONCURRENCY_LIMIT):
+        # Restart the oldest instance of this sound rather than stacking another one on top of it.
+        channel = channels.pop(0)
+    else:
+        channel = pygame.mixer.find_channel(True)
+        if channel is None:
+            return
+
+    channel.play(sound)
+    channel.set_volume(volume)
+    channels.append(channel)
@@ -5,225 +5,582 @@ from pygine.utilities import CameraType, Color
 
 
 class Quadtree:
+    "A quadtree stored in flat, pooled arrays, so clearing and rebuilding it every frame does not allocate."
+
+    INITIAL_POOL_SIZE = 64
+
     def __init__(self, boundary, capacity):
         self.boundary = boundary
         self.capacity = capacity
 
-        self.divided = False
-        self.insertion_index = 0
-        self.objects = [None] * self.capacity
-
-        self.topLeft = None
-        self.topRight = None
-        self.bottomRight = None
-        self.bottomLeft = None
+        self.__bounds = []
+        # The boundary of a node grown to also cover every object stored in its subtree, since objects are only
+        # stored in the first node they collide with and can stick out of it.
+        self.__loose_bounds = []
+        self.__children = []
+        self.__counts = []
+        # The collision layers of every object stored in a node's subtree, so masked queries can skip whole subtrees.
+        self.__layers = []
+        self.__objects = []
+        self.__total_nodes = 0
+        self.__grow_pool(Quadtree.INITIAL_POOL_SIZE)
+
+        self.clear()
+
+    def __grow_pool(self, total):
+        for i in range(total):
+            self.__bounds.append(Rect(0, 0, 0, 0))
+            self.__loose_bounds.append(Rect(0, 0, 0, 0))
+            self.__children.append(-1)
+            self.__counts.append(0)
+            self.__layers.append(0)
+        self.__objects.extend([None] * (total * self.capacity))
 
     def insert(self, pygine_object):
-        if not pygine_object.bounds.colliderect(self.boundary):
+        return self.__insert(0, pygine_object, getattr(pygine_object, "collision_layer", 0))
+
+    def __insert(self, node, pygine_object, layer):
+        if not pygine_object.bounds.colliderect(self.__bounds[node]):
             return False
 
-        if self.insertion_index < self.capacity:
-            self.objects[self.insertion_index] = pygine_object
-            self.insertion_index += 1
+        if self.__counts[node] < self.capacity:
+            self.__objects[node * self.capacity + self.__counts[node]] = pygine_object
+            self.__counts[node] += 1
+            self.__loose_bounds[node].union_ip(pygine_object.bounds)
+            self.__layers[node] |= layer
             return True
-        else:
-            if not self.divided:
-                self.__subdivide()
 
-            if (
-                self.topLeft.insert(pygine_object) or
-                self.topRight.insert(pygine_object) or
-                self.bottomRight.insert(pygine_object) or
-                self.bottomLeft.insert(pygine_object)
-            ):
-                return True
+        if self.__children[node] < 0:
+            self.__subdivide(node)
+
+        child = self.__children[node]
+        if (
+            self.__insert(child, pygine_object, layer) or
+            self.__insert(child + 1, pygine_object, layer) or
+            self.__insert(child + 2, pygine_object, layer) or
+            self.__insert(child + 3, pygine_object, layer)
+        ):
+            self.__loose_bounds[node].union_ip(pygine_object.bounds)
+            self.__layers[node] |= layer
+            return True
 
         return False
 
-    def query(self, area):    
-        #if not area.colliderect(self.boundary):
-        #    return []
+    def query(self, area, result=None, mask=None):
+        "Returns every object that collides with area, and is on one of the collision layers in mask if one is given. Pass in a list as result to reuse it instead of allocating a new one."
+        if result is None:
+            result = []
+        else:
+            del result[:]
+
+        if mask is None:
+            self.__query(0, area, result)
+        else:
+            self.__query_masked(0, area, mask, result)
+        return result
+
+    def __query(self, node, area, result):
+        if not area.colliderect(self.__loose_bounds[node]):
+            return
 
-        result = []
+        start = node * self.capacity
+        for i in range(start, start + self.__counts[node]):
+            if area.colliderect(self.__objects[i].bounds):
+                result.append(self.__objects[i])
 
-        for i in range(len(self.objects)):
-            if self.objects[i] == None:
-                continue
+        child = self.__children[node]
+        if child < 0:
+            return
 
-            if area.colliderect(self.objects[i].bounds):
-                result.append(self.objects[i])
+        self.__query(child, area, result)
+        self.__query(child + 1, area, result)
+        self.__query(child + 2, area, result)
+        self.__query(child + 3, area, result)
 
-        if not self.divided:
-            return result
+    def __query_masked(self, node, area, mask, result):
+        if not self.__layers[node] & mask or not area.colliderect(self.__loose_bounds[node]):
+            return
 
-        result.extend(self.topLeft.query(area))
-        result.extend(self.topRight.query(area))
-        result.extend(self.bottomRight.query(area))
-        result.extend(self.bottomLeft.query(area))
+        start = node * self.capacity
+        for i in range(start, start + self.__counts[node]):
+            if self.__objects[i].collision_layer & mask and area.colliderect(self.__objects[i].bounds):
+                result.append(self.__objects[i])
 
-        return result
+        child = self.__children[node]
+        if child < 0:
+            return
+
+        self.__query_masked(child, area, mask, result)
+        self.__query_masked(child + 1, area, mask, result)
+        self.__query_masked(child + 2, area, mask, result)
+        self.__query_masked(child + 3, area, mask, result)
 
     def clear(self):
-        if self.divided:
-            self.topLeft.clear()
-            self.topRight.clear()
-            self.bottomRight.clear()
-            self.bottomLeft.clear()
-
-            self.topLeft = None
-            self.topRight = None
-            self.bottomRight = None
-            self.bottomLeft = None
-
-        self.divided = False
-        self.insertion_index = 0
-        self.objects = [None] * self.capacity
-
-    def __subdivide(self):
-        self.divided = True
-        self.topLeft = Quadtree(
-            Rect(
-                self.boundary.x,
-                self.boundary.y,
-                self.boundary.width / 2,
-                self.boundary.height / 2
-            ),
-            self.capacity
+        # Nodes past __total_nodes are free. Their stale bounds, counts and objects are reset when they are reused.
+        self.__total_nodes = 1
+        self.__set_node(0, self.boundary.x, self.boundary.y,
+                        self.boundary.width, self.boundary.height)
+
+    def __set_node(self, node, x, y, width, height):
+        bounds = self.__bounds[node]
+        bounds.x = int(x)
+        bounds.y = int(y)
+        bounds.width = int(width)
+        bounds.height = int(height)
+        self.__loose_bounds[node].x = bounds.x
+        self.__loose_bounds[node].y = bounds.y
+        self.__loose_bounds[node].width = bounds.width
+        self.__loose_bounds[node].height = bounds.height
+        self.__children[node] = -1
+        self.__counts[node] = 0
+        self.__layers[node] = 0
+
+    def __subdivide(self, node):
+        # The four children are stored next to each other: top left, top right, bottom right, bottom left.
+        child = self.__total_nodes
+        if child + 4 > len(self.__bounds):
+            self.__grow_pool(len(self.__bounds))
+        self.__total_nodes += 4
+        self.__children[node] = child
+
+        boundary = self.__bounds[node]
+        self.__set_node(
+            child,
+            boundary.x,
+            boundary.y,
+            boundary.width / 2,
+            boundary.height / 2
         )
-        self.topRight = Quadtree(
-            Rect(
-                self.boundary.x + self.boundary.width / 2,
-                self.boundary.y,
-                self.boundary.width / 2,
-                self.boundary.height / 2
-            ),
-            self.capacity
+        self.__set_node(
+            child + 1,
+            boundary.x + boundary.width / 2,
+            boundary.y,
+            boundary.width / 2,
+            boundary.height / 2
         )
-        self.bottomRight = Quadtree(
-            Rect(
-                self.boundary.x + self.boundary.width / 2,
-                self.boundary.y + self.boundary.height / 2,
-                self.boundary.width / 2,
-                self.boundary.height / 2
-            ),
-            self.capacity
+        self.__set_node(
+            child + 2,
+            boundary.x + boundary.width / 2,
+            boundary.y + boundary.height / 2,
+            boundary.width / 2,
+            boundary.height / 2
         )
-        self.bottomLeft = Quadtree(
-            Rect(
-                self.boundary.x,
-                self.boundary.y + self.boundary.height / 2,
-                self.boundary.width / 2,
-                self.boundary.height / 2
-            ),
-            self.capacity
+        self.__set_node(
+            child + 3,
+            boundary.x,
+            boundary.y + boundary.height / 2,
+            boundary.width / 2,
+            boundary.height / 2
         )
 
     def draw(self, surface):
-        draw_rectangle(
-            surface,
-            self.boundary,
-            CameraType.DYNAMIC,
-            Color.BLACK,
-            1
-        )
+        for node in range(self.__total_nodes):
+            draw_rectangle(
+                surface,
+                self.__bounds[node],
+                CameraType.DYNAMIC,
+                Color.BLACK,
+                1
+            )
 
-        if self.divided:
-            self.topLeft.draw(surface)
-            self.topRight.draw(surface)
-            self.bottomRight.draw(surface)
-            self.bottomLeft.draw(surface)
 
+class CollisionMap:
+    "The static solid geometry of a level, rasterized into a dense grid of 2^power_of_two sized tiles and merged back into as few rectangles as possible."
 
-class Bin:
     def __init__(self, boundary, power_of_two):
         self.boundary = boundary
         self.power_of_two = power_of_two
-        self.cell_size = 1 << self.power_of_two
+        self.tile_size = 1 << self.power_of_two
+
+        self.columns = int(math.ceil(self.boundary.width / self.tile_size))
+        self.rows = int(math.ceil(self.boundary.height / self.tile_size))
+
+        # The index of the rectangle that covers each tile, or -1 if the tile is empty.
+        self.tiles = [-1] * (self.rows * self.columns)
+        self.rectangles = []
+        self.__stamps = []
+        self.__stamp = 0
+
+    def __calculate_range(self, bounds):
+        if not bounds.colliderect(self.boundary):
+            return None
+
+        return (
+            max((bounds.left - self.boundary.x) >> self.power_of_two, 0),
+            max((bounds.top - self.boundary.y) >> self.power_of_two, 0),
+            min((bounds.right - 1 - self.boundary.x) >> self.power_of_two, self.columns - 1),
+            min((bounds.bottom - 1 - self.boundary.y) >> self.power_of_two, self.rows - 1)
+        )
 
-        self.columns = int(math.ceil(float(self.boundary.width / self.power_of_two)))
-        self.rows = int(math.ceil(float(self.boundary.height / self.power_of_two)))
+    def build(self, rectangles):
+        "Replaces the map with the given solid rectangles. Solid tiles are merged greedily, first into rows and then into columns."
+        solid = bytearray(self.rows * self.columns)
+        for rectangle in rectangles:
+            cells_range = self.__calculate_range(rectangle)
+            if cells_range is None:
+                continue
+            left, top, right, bottom = cells_range
+            for y in range(top, bottom + 1):
+                row = y * self.columns
+                solid[row + left:row + right + 1] = b"\x01" * (right - left + 1)
 
-        self.buckets = [set() for i in range(self.rows * self.columns)]
+        self.tiles = [-1] * (self.rows * self.columns)
+        self.rectangles = []
 
-    def insert(self, pygine_object):
-        if not pygine_object.bounds.colliderect(self.boundary):
-            return False
+        for y in range(self.rows):
+            for x in range(self.columns):
+                if not solid[y * self.columns + x] or self.tiles[y * self.columns + x] != -1:
+                    continue
+
+                right = x
+                while (
+                    right + 1 < self.columns and
+                    solid[y * self.columns + right + 1] and
+                    self.tiles[y * self.columns + right + 1] == -1
+                ):
+                    right += 1
+
+                bottom = y
+                while bottom + 1 < self.rows and all(
+                    solid[(bottom + 1) * self.columns + i] and
+                    self.tiles[(bottom + 1) * self.columns + i] == -1
+                    for i in range(x, right + 1)
+                ):
+                    bottom += 1
+
+                index = len(self.rectangles)
+                self.rectangles.append(Rect(
+                    self.boundary.x + x * self.tile_size,
+                    self.boundary.y + y * self.tile_size,
+                    (right - x + 1) * self.tile_size,
+                    (bottom - y + 1) * self.tile_size
+                ))
+                for j in range(y, bottom + 1):
+                    for i in range(x, right + 1):
+                        self.tiles[j * self.columns + i] = index
+
+        self.__stamps = [0] * len(self.rectangles)
+
+    def query(self, area, result=None):
+        "Returns every solid rectangle that collides with area, by only visiting the tiles area overlaps. Pass in a list as result to reuse it instead of allocating a new one."
+        if result is None:
+            result = []
+        else:
+            del result[:]
 
-        ids = self.__hash_ids(pygine_object.bounds)
+        cells_range = self.__calculate_range(area)
+        if cells_range is None:
+            return result
 
-        for i in ids:
-            self.buckets[i].add(pygine_object)
+        self.__stamp += 1
+        stamp = self.__stamp
+        left, top, right, bottom = cells_range
+        for y in range(top, bottom + 1):
+            row = y * self.columns
+            for x in range(left, right + 1):
+                index = self.tiles[row + x]
+                if index == -1 or self.__stamps[index] == stamp:
+                    continue
+                self.__stamps[index] = stamp
+                if area.colliderect(self.rectangles[index]):
+                    result.append(self.rectangles[index])
 
-        return len(ids) > 0
+        return result
 
-    def query(self, area):
-        if not area.colliderect(self.boundary):
-            return []
+    def draw(self, surface):
+        for rectangle in self.rectangles:
+            draw_rectangle(surface, rectangle, CameraType.DYNAMIC, Color.WHITE, 4)
 
-        result = []
-        objects = set()
-        ids = self.__hash_ids(area)
 
-        for i in ids:
-            for pygine_object in self.buckets[i]:
-                objects.add(pygine_object)
+class SpatialHash:
+    "A uniform grid of 2^power_of_two sized cells, where every object is stored in each cell it overlaps."
 
-        for pygine_object in objects:
-            result.append(pygine_object)
+    def __init__(self, boundary, power_of_two):
+        self.boundary = boundary
+        self.power_of_two = power_of_two
+        self.cell_size = 1 << self.power_of_two
 
-        objects.clear()
-        ids.clear()
+        self.columns = int(math.ceil(self.boundary.width / self.cell_size))
+        self.rows = int(math.ceil(self.boundary.height / self.cell_size))
+
+        # Cells hold slots into _objects. An object spanning several cells is only checked once per query, by
+        # stamping its slot with the id of the current query.
+        self.cells = [[] for i in range(self.rows * self.columns)]
+        self._objects = []
+        self._ranges = []
+        self._stamps = []
+        self._stamp = 0
+
+    def _calculate_range(self, bounds):
+        "Returns the (left, top, right, bottom) cells that bounds overlaps, or None if it is outside of the grid."
+        if not bounds.colliderect(self.boundary):
+            return None
+
+        left = (bounds.left - self.boundary.x) >> self.power_of_two
+        top = (bounds.top - self.boundary.y) >> self.power_of_two
+        right = (bounds.right - 1 - self.boundary.x) >> self.power_of_two
+        bottom = (bounds.bottom - 1 - self.boundary.y) >> self.power_of_two
+
+        return (
+            max(left, 0),
+            max(top, 0),
+            max(min(right, self.columns - 1), left),
+            max(min(bottom, self.rows - 1), top)
+        )
 
-        return result
+    def _add_to_cells(self, slot, cells_range):
+        if cells_range is None:
+            return
+        left, top, right, bottom = cells_range
+        for y in range(top, bottom + 1):
+            row = y * self.columns
+            for x in range(left, right + 1):
+                self.cells[row + x].append(slot)
+
+    def _remove_from_cells(self, slot, cells_range):
+        if cells_range is None:
+            return
+        left, top, right, bottom = cells_range
+        for y in range(top, bottom + 1):
+            row = y * self.columns
+            for x in range(left, right + 1):
+                self.cells[row + x].remove(slot)
 
-    def clear(self):
-        for i in range(len(self.buckets)):
-            self.buckets[i].clear()
-
-    def __hash_ids(self, bounds):
-        result = set()
-        x = -1
-        y = -1
-        
-        if bounds.width > self.cell_size or bounds.height > self.cell_size:
-            for height_offset in range(0, bounds.height, self.cell_size):
-                for width_offset in range(0, bounds.width, self.cell_size):
-                    x = int(bounds.x + width_offset) >> self.power_of_two
-                    y = int(bounds.y + height_offset) >> self.power_of_two
-
-                    if x < 0 or x >= self.columns or y < 0 or y >= self.rows:
-                        continue
+    def insert(self, pygine_object):
+        cells_range = self._calculate_range(pygine_object.bounds)
+        if cells_range is None:
+            return False
 
-                    result.add(self.columns * y + x)
-
-        for i in range(4):
-            if i == 0:
-                x = int(bounds.x) >> self.power_of_two
-                y = int(bounds.y) >> self.power_of_two
-            elif i == 1:
-                x = int(bounds.x + bounds.width) >> self.power_of_two
-                y = int(bounds.y) >> self.power_of_two
-            elif i == 2:
-                x = int(bounds.x + bounds.width) >> self.power_of_two
-                y = int(bounds.y + bounds.height) >> self.power_of_two
-            elif i == 3:
-                x = int(bounds.x) >> self.power_of_two
-                y = int(bounds.y + bounds.height) >> self.power_of_two
-
-            if x < 0 or x >= self.columns or y < 0 or y >= self.rows:
-                continue
+        slot = len(self._objects)
+        self._objects.append(pygine_object)
+        self._ranges.append(cells_range)
+        self._stamps.append(0)
+        self._add_to_cells(slot, cells_range)
 
-            result.add(self.columns * y + x)
+        return True
+
+    def query(self, area, result=None, mask=None):
+        "Returns every object that collides with area, and is on one of the collision layers in mask if one is given. Pass in a list as result to reuse it instead of allocating a new one."
+        if result is None:
+            result = []
+        else:
+            del result[:]
+
+        cells_range = self._calculate_range(area)
+        if cells_range is None:
+            return result
+
+        self._stamp += 1
+        stamp = self._stamp
+        stamps = self._stamps
+        objects = self._objects
+        left, top, right, bottom = cells_range
+        for y in range(top, bottom + 1):
+            row = y * self.columns
+            for x in range(left, right + 1):
+                for slot in self.cells[row + x]:
+                    if stamps[slot] == stamp:
+                        continue
+                    stamps[slot] = stamp
+                    if mask is not None and not objects[slot].collision_layer & mask:
+                        continue
+                    if area.colliderect(objects[slot].bounds):
+                        result.append(objects[slot])
 
         return result
 
+    def clear(self):
+        # Only empty the cells that are actually occupied, since most of a level is usually empty space.
+        for cells_range in self._ranges:
+            if cells_range is None:
+                continue
+            left, top, right, bottom = cells_range
+            for y in range(top, bottom + 1):
+                row = y * self.columns
+                for x in range(left, right + 1):
+                    del self.cells[row + x][:]
+        del self._objects[:]
+        del self._ranges[:]
+        del self._stamps[:]
+
     def draw(self, surface):
         for y in range(self.rows):
             for x in range(self.columns):
                 draw_rectangle(
                     surface,
-                    Rect(x * self.cell_size, y * self.cell_size, self.cell_size, self.cell_size),
+                    Rect(
+                        self.boundary.x + x * self.cell_size,
+                        self.boundary.y + y * self.cell_size,
+                        self.cell_size,
+                        self.cell_size
+                    ),
                     CameraType.DYNAMIC,
                     Color.BLACK,
                     1
-                )
\ No newline at end of file
+                )
+
+
+class KineticGrid(SpatialHash):
+    "A SpatialHash for moving entities. Entities report their moves, and only the ones that change cells update the grid."
+
+    def __init__(self, boundary, power_of_two):
+        super(KineticGrid, self).__init__(boundary, power_of_two)
+
+        # Entities outside of the grid are still tracked (with a range of None) so they can move back in.
+        self.__slots = {}
+        self.__free_slots = []
+
+        self.updates = 0
+
+    def insert(self, entity):
+        if entity.spatial_index is not None and entity.spatial_index is not self:
+            entity.spatial_index.remove(entity)
+
+        if entity in self.__slots:
+            self.move(entity)
+            return self._ranges[self.__slots[entity]] is not None
+
+        if len(self.__free_slots) > 0:
+            slot = self.__free_slots.pop()
+            self._objects[slot] = entity
+        else:
+            slot = len(self._objects)
+            self._objects.append(entity)
+            self._ranges.append(None)
+            self._stamps.append(0)
+
+        entity.spatial_index = self
+        self.__slots[entity] = slot
+        self.move(entity)
+
+        return self._ranges[slot] is not None
+
+    def move(self, entity):
+        "Call this whenever a tracked entity's bounds change. Does nothing unless the entity changed cells."
+        slot = self.__slots[entity]
+        cells_range = self._calculate_range(entity.bounds)
+        if cells_range == self._ranges[slot]:
+            return
+
+        self._remove_from_cells(slot, self._ranges[slot])
+        self._add_to_cells(slot, cells_range)
+        self._ranges[slot] = cells_range
+        self.updates += 1
+
+    def remove(self, entity):
+        if entity not in self.__slots:
+            return
+
+        slot = self.__slots.pop(entity)
+        self._remove_from_cells(slot, self._ranges[slot])
+        self._objects[slot] = None
+        self._ranges[slot] = None
+        self.__free_slots.append(slot)
+        entity.spatial_index = None
+        self.updates += 1
+
+    def reset_updates(self):
+        "Returns how many times the grid was updated since the last call."
+        total = self.updates
+        self.updates = 0
+        return total
+
+    def clear(self):
+        for entity in self.__slots:
+            entity.spatial_index = None
+        self.__slots.clear()
+        del self.__free_slots[:]
+        super(KineticGrid, self).clear()
+
+
+class SweepAndPrune:
+    "A sort and sweep broadphase along the x axis that finds every pair of entities within 2 * margin of each other once per frame."
+
+    def __init__(self, margin):
+        self.margin = margin
+
+        # Entities stay sorted between frames, so when they only move a little the insertion sort is nearly linear.
+        self.entities = []
+        self.pairs = []
+        self.__contacts = {}
+        self.__no_contacts = []
+
+    def insert(self, entity):
+        if entity in self.__contacts:
+            return
+        self.entities.append(entity)
+        self.__contacts[entity] = []
+
+    def remove(self, entity):
+        if entity not in self.__contacts:
+            return
+        self.entities.remove(entity)
+        del self.__contacts[entity]
+
+    def clear(self):
+        del self.entities[:]
+        del self.pairs[:]
+        self.__contacts.clear()
+
+    def update(self):
+        entities = self.entities
+        for i in range(1, len(entities)):
+            entity = entities[i]
+            left = entity.bounds.left
+            j = i - 1
+            while j >= 0 and entities[j].bounds.left > left:
+                entities[j + 1] = entities[j]
+                j -= 1
+            entities[j + 1] = entity
+
+        del self.pairs[:]
+        for contacts in self.__contacts.values():
+            del contacts[:]
+
+        reach = self.margin * 2
+        total = len(entities)
+        for i in range(total):
+            a = entities[i]
+            right = a.bounds.right + reach
+            top = a.bounds.top - reach
+            bottom = a.bounds.bottom + reach
+            for j in range(i + 1, total):
+                b = entities[j]
+                if b.bounds.left >= right:
+                    break
+                if b.bounds.top < bottom and b.bounds.bottom > top:
+                    self.pairs.append((a, b))
+                    self.__contacts[a].append(b)
+                    self.__contacts[b].append(a)
+
+    def get_contacts(self, entity):
+        "Returns every entity that was paired with the given entity during the last update. Do not modify the result."
+        return self.__contacts.get(entity, self.__no_contacts)
+
+
+class EntityRegistry:
+    "Keeps the entities of a scene grouped by collision layer, so every entity of one type can be visited without looking at all the others."
+
+    def __init__(self):
+        # Dictionaries keep insertion order and make removing an entity constant time.
+        self.__layers = {}
+        self.__no_entities = {}
+
+    def insert(self, entity):
+        self.__layers.setdefault(entity.collision_layer, {})[entity] = None
+
+    def remove(self, entity):
+        entities = self.__layers.get(entity.collision_layer)
+        if entities != None:
+            entities.pop(entity, None)
+
+    def contains(self, entity):
+        entities = self.__layers.get(entity.collision_layer)
+        return entities != None and entity in entities
+
+    def get(self, layer):
+        "Returns every registered entity on the given collision layer. Do not add or remove entities while iterating over the result."
+        return self.__layers.get(layer, self.__no_entities)
+
+    def clear(self):
+        self.__layers.clear()
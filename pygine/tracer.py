@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+    "Records spans of engine activity, and writes them in the trace event format that chrome://tracing and Perfetto open."
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.__start = 0
+
+    def start(self):
+        "Starts recording. Until this is called begin() and end() return right away, so leaving them in costs next to nothing."
+        self.events = []
+        self.__start = time.perf_counter()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def begin(self, name, category, detail=None):
+        "Opens a span. The optional detail, like which file is being loaded, shows up in the span's arguments."
+        if not self.enabled:
+            return
+        self.events.append(("B", name, category, time.perf_counter(), threading.current_thread().ident, detail))
+
+    def end(self, name, category):
+        if not self.enabled:
+            return
+        self.events.append(("E", name, category, time.perf_counter(), threading.current_thread().ident, None))
+
+    def write(self, path):
+        "Writes everything recorded so far to path as a JSON trace."
+        process = os.getpid()
+        trace_events = [{
+            "name": "process_name",
+            "ph": "M",
+            "pid": process,
+            "args": {"name": "Quantum Caverns"}
+        }]
+
+        threads = {}
+        for phase, name, category, timestamp, thread, detail in self.events:
+            if thread not in threads:
+                threads[thread] = "main" if thread == threading.main_thread().ident else "worker " + str(len(threads))
+                trace_events.append({
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": process,
+                    "tid": thread,
+                    "args": {"name": threads[thread]}
+                })
+
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": phase,
+                "ts": (timestamp - self.__start) * 1e6,
+                "pid": process,
+                "tid": thread
+            }
+            if detail != None:
+                event["args"] = {"detail": str(detail)}
+            trace_events.append(event)
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+
+# The one tracer the whole engine reports to.
+tracer = Tracer()
@@ -23,7 +23,9 @@ class Color:
     TEAL = (0, 136, 136)
 
 
-class Timer:
+class Timer(object):
+    __slots__ = ("length", "started", "done", "ticks")
+
     def __init__(self, length, started=False):
         self.length = length
         self.started = started